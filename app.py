@@ -1,16 +1,108 @@
+import json
+import time
 import streamlit as st
 import requests
 
 # Set backend URL (adjust if necessary)
 BACKEND_URL = "http://localhost:8000"
 
+# Update any URLs or references to point to the deployed app
+APP_URL = "https://jobseekerbuddy.streamlit.app/"
+
 st.title("JobSeeker Buddy")
 
+def show_generation_status(data):
+    """
+    Surface per-document failures and timings from a generation response.
+    """
+    for name, error in data.get("errors", {}).items():
+        hint = " You can retry." if error.get("retryable") else ""
+        st.warning(f"{name.replace('_', ' ').title()} could not be generated: {error.get('detail')}.{hint}")
+    timings = data.get("timings")
+    if timings:
+        st.caption(" · ".join(f"{name.replace('_', ' ')}: {seconds:.1f}s" for name, seconds in timings.items()))
+
+def run_job(path, payload, poll_interval=2, max_wait=600):
+    """
+    Submit a background generation job and poll until it finishes, for at
+    most `max_wait` seconds. Returns the job result, or None after showing
+    the error.
+    """
+    response = requests.post(f"{BACKEND_URL}/jobs/{path}", json=payload)
+    if response.status_code != 202:
+        st.error(f"Failed to submit job: {response.json().get('detail', 'Unknown error occurred')}")
+        return None
+    job_id = response.json()["job_id"]
+    deadline = time.monotonic() + max_wait
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        response = requests.get(f"{BACKEND_URL}/jobs/{job_id}")
+        if response.status_code != 200:
+            continue
+        job = response.json()
+        if job["status"] == "done":
+            return job["result"]
+        if job["status"] == "failed":
+            st.error(f"Job failed: {job['error'].get('detail')}")
+            return None
+    st.error(f"Job {job_id} is still running after {max_wait} seconds, please try again later.")
+    return None
+
+def stream_job(path, payload, titles):
+    """
+    Call a streaming generation endpoint and render each document as its
+    tokens arrive. Returns the final summary event, or None on failure.
+    """
+    placeholders = {}
+    texts = {}
+    for name, title in titles.items():
+        st.subheader(title)
+        placeholders[name] = st.empty()
+        texts[name] = ""
+    response = requests.post(f"{BACKEND_URL}/{path}/stream", json=payload, stream=True, timeout=(10, None))
+    if response.status_code != 200:
+        st.error(f"Generation failed: {response.json().get('detail', 'Unknown error occurred')}")
+        return None
+    summary = None
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data = json.loads(line[len("data:"):])
+            if event in ("token", "unchanged"):
+                texts[data["document"]] += data["text"]
+                placeholders[data["document"]].text(texts[data["document"]])
+            elif event == "complete":
+                summary = data
+    # Swap the live text for editable text areas once generation is over
+    for name, title in titles.items():
+        placeholders[name].text_area(title, texts[name], height=300)
+    return summary
+
+def show_documents(path, payload, titles, spinner_text):
+    """
+    Generate documents either by streaming tokens or through a background job.
+    """
+    if stream_output:
+        data = stream_job(path, payload, titles)
+        if data:
+            show_generation_status(data)
+        return
+    with st.spinner(spinner_text):
+        data = run_job(path, payload)
+    if data:
+        show_generation_status(data)
+        for name, title in titles.items():
+            st.subheader(title)
+            st.text_area(title, data.get(name) or "", height=300)
+
 # ------------------------------
 # User Setup & Asset Upload
 # ------------------------------
 st.sidebar.header("User Setup")
 user_id = st.sidebar.text_input("Enter User ID", value="user123")
+stream_output = st.sidebar.checkbox("Stream documents as they are generated", value=True)
 
 if user_id:
     response = requests.get(f"{BACKEND_URL}/user_assets/{user_id}")
@@ -68,6 +160,37 @@ if st.button("Create Application"):
     else:
         st.error("Please provide a job posting URL and User ID.")
 
+with st.expander("Import several job postings"):
+    batch_links = st.text_area("Paste one job posting URL per line")
+    if st.button("Import Postings"):
+        links = [link.strip() for link in batch_links.splitlines() if link.strip()]
+        if links and user_id:
+            response = requests.post(
+                f"{BACKEND_URL}/new_applications/batch",
+                json={"job_links": links, "user_id": user_id}
+            )
+            if response.status_code == 200:
+                st.session_state.batch_id = response.json().get("batch_id")
+            else:
+                error_message = response.json().get("detail", "Unknown error occurred")
+                st.error(f"Failed to import postings: {error_message}")
+        else:
+            st.error("Please provide at least one job posting URL and User ID.")
+
+    if "batch_id" in st.session_state:
+        response = requests.get(f"{BACKEND_URL}/new_applications/batch/{st.session_state.batch_id}")
+        if response.status_code == 200:
+            batch = response.json()
+            done = batch["completed"] + batch["failed"]
+            st.progress(done / batch["total"], text=f"{done}/{batch['total']} processed ({batch['failed']} failed)")
+            for result in batch["results"]:
+                if result["status"] == "done":
+                    st.write(f"✅ {result['job_link']} → {result['application_id']}")
+                elif result["status"] == "failed":
+                    st.write(f"❌ {result['job_link']}: {result.get('error')}")
+            if batch["status"] != "done":
+                st.button("Refresh progress")
+
 # ------------------------------
 # Document Generation
 # ------------------------------
@@ -75,38 +198,40 @@ st.header("Generate Documents")
 if "application_id" in st.session_state:
     if st.button("Generate Cover Letter & Resume"):
         payload = {"application_id": st.session_state.application_id, "user_id": user_id}
-        with st.spinner("Generating documents..."):
-            response = requests.post(f"{BACKEND_URL}/generate_documents", json=payload)
-            if response.status_code == 200:
-                data = response.json()
-                st.subheader("Cover Letter")
-                st.text_area("Cover Letter", data.get("cover_letter"), height=300)
-                st.subheader("Customized Resume")
-                st.text_area("Resume", data.get("resume"), height=300)
-            else:
-                st.error("Document generation failed.")
+        show_documents(
+            "generate_documents",
+            payload,
+            {"cover_letter": "Cover Letter", "resume": "Customized Resume"},
+            "Generating documents..."
+        )
 
 # ------------------------------
 # Feedback & Iteration
 # ------------------------------
 st.header("Feedback & Iteration")
 feedback = st.text_input("Enter your feedback for the generated documents")
+feedback_target = st.radio(
+    "Apply feedback to",
+    ["Auto-detect", "Both", "Cover letter", "Resume"],
+    horizontal=True
+)
 if st.button("Submit Feedback"):
     if "application_id" in st.session_state and feedback:
         payload = {
             "application_id": st.session_state.application_id,
             "user_id": user_id,
-            "feedback": feedback
+            "feedback": feedback,
+            "target": {"Both": "both", "Cover letter": "cover_letter", "Resume": "resume"}.get(feedback_target)
         }
-        with st.spinner("Regenerating documents with feedback..."):
-            response = requests.post(f"{BACKEND_URL}/feedback", json=payload)
-            if response.status_code == 200:
-                data = response.json()
-                st.subheader("Updated Cover Letter")
-                st.text_area("Cover Letter", data.get("cover_letter"), height=300)
-                st.subheader("Updated Resume")
-                st.text_area("Resume", data.get("resume"), height=300)
-            else:
-                st.error("Feedback processing failed.")
+        show_documents(
+            "feedback",
+            payload,
+            {"cover_letter": "Updated Cover Letter", "resume": "Updated Resume"},
+            "Regenerating documents with feedback..."
+        )
     else:
         st.error("Please provide feedback and ensure an application exists.")
+
+# If you have any sharing or linking functionality, update it like:
+if st.button("Share this app"):
+    st.markdown(f"Share this app: {APP_URL}")
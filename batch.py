@@ -0,0 +1,168 @@
+import os
+import time
+import uuid
+import asyncio
+from urllib.parse import urlsplit
+
+# ------------------------------
+# Batch job application import
+# ------------------------------
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "8"))
+# Minimum seconds between two requests to the same job site
+BATCH_DOMAIN_INTERVAL = float(os.getenv("BATCH_DOMAIN_INTERVAL", "1.0"))
+# Firestore accepts at most 500 writes per batch
+BATCH_WRITE_SIZE = min(int(os.getenv("BATCH_WRITE_SIZE", "50")), 500)
+BATCH_MAX_LINKS = int(os.getenv("BATCH_MAX_LINKS", "200"))
+# Minimum seconds between two progress writes while a batch runs
+BATCH_PERSIST_INTERVAL = float(os.getenv("BATCH_PERSIST_INTERVAL", "2.0"))
+
+
+class DomainRateLimiter:
+    """
+    Spaces out requests to the same domain by at least `interval` seconds,
+    while requests to different domains proceed in parallel.
+    """
+    def __init__(self, interval: float = BATCH_DOMAIN_INTERVAL):
+        self.interval = interval
+        self._locks = {}
+        self._last_request = {}
+
+    async def wait(self, url: str):
+        domain = urlsplit(url).netloc.lower()
+        lock = self._locks.setdefault(domain, asyncio.Lock())
+        async with lock:
+            elapsed = time.monotonic() - self._last_request.get(domain, 0)
+            if elapsed < self.interval:
+                await asyncio.sleep(self.interval - elapsed)
+            self._last_request[domain] = time.monotonic()
+
+
+class BatchScheduler:
+    """
+    Runs batches of job links through a bounded pool of workers.
+
+    `process(user_id, link)` must return `(application_id, app_doc)` or raise,
+    and `write(items)` persists a list of `(application_id, app_doc)` pairs in
+    one round trip. Progress is passed to `persist(batch)` as the batch runs
+    (at most every BATCH_PERSIST_INTERVAL seconds) so that `get()` can read
+    it back from any worker process.
+    """
+    def __init__(self, max_workers: int = BATCH_MAX_WORKERS, write_size: int = BATCH_WRITE_SIZE,
+                 rate_limiter: DomainRateLimiter = None, persist=None, load=None):
+        self.max_workers = max_workers
+        self.write_size = write_size
+        self.rate_limiter = rate_limiter or DomainRateLimiter()
+        self.persist = persist
+        self.load = load
+        self.batches = {}
+        self._tasks = {}
+        self._last_saved = {}
+
+    async def submit(self, user_id: str, links: list, process, write) -> str:
+        batch_id = str(uuid.uuid4())
+        self.batches[batch_id] = {
+            "batch_id": batch_id,
+            "user_id": user_id,
+            "status": "queued",
+            "total": len(links),
+            "completed": 0,
+            "failed": 0,
+            "created_at": time.time(),
+            "finished_at": None,
+            "results": [{"job_link": link, "status": "queued"} for link in links],
+        }
+        await self._save(batch_id, force=True)
+        task = asyncio.create_task(self._run(batch_id, process, write))
+        # Keep a reference so the task is not garbage collected mid-run
+        self._tasks[batch_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(batch_id, None))
+        return batch_id
+
+    async def get(self, batch_id: str):
+        batch = self.batches.get(batch_id)
+        if batch is None and self.load is not None:
+            batch = await asyncio.to_thread(self.load, batch_id)
+        return batch
+
+    async def _save(self, batch_id: str, force: bool = False):
+        if self.persist is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_saved.get(batch_id, 0) < BATCH_PERSIST_INTERVAL:
+            return
+        self._last_saved[batch_id] = now
+        batch = self.batches[batch_id]
+        try:
+            snapshot = {**batch, "results": [dict(result) for result in batch["results"]]}
+            await asyncio.to_thread(self.persist, snapshot)
+        except Exception as e:
+            print(f"Error persisting batch {batch_id}: {e}")
+
+    async def _run(self, batch_id: str, process, write):
+        batch = self.batches[batch_id]
+        batch["status"] = "running"
+        queue = asyncio.Queue()
+        for result in batch["results"]:
+            queue.put_nowait(result)
+        pending_writes = []
+        write_lock = asyncio.Lock()
+
+        async def flush():
+            async with write_lock:
+                if not pending_writes:
+                    return
+                items = pending_writes[:]
+                pending_writes.clear()
+                try:
+                    await asyncio.to_thread(write, [(r["application_id"], doc) for r, doc in items])
+                except Exception as e:
+                    print(f"Error writing batch {batch_id}: {e}")
+                    for result, _ in items:
+                        self._fail(batch, result, f"Write failed: {e}")
+                    return
+                for result, _ in items:
+                    result["status"] = "done"
+                    batch["completed"] += 1
+            await self._save(batch_id)
+
+        async def worker():
+            while True:
+                try:
+                    result = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result["status"] = "running"
+                try:
+                    await self.rate_limiter.wait(result["job_link"])
+                    application_id, app_doc = await process(batch["user_id"], result["job_link"])
+                except Exception as e:
+                    self._fail(batch, result, getattr(e, "detail", None) or str(e))
+                    await self._save(batch_id)
+                    continue
+                # Only the id: the job details are in the application, and
+                # copying them here could push the batch past Firestore's
+                # 1 MiB document limit
+                result["application_id"] = application_id
+                pending_writes.append((result, app_doc))
+                if len(pending_writes) >= self.write_size:
+                    await flush()
+
+        workers = min(self.max_workers, len(batch["results"])) or 1
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        await flush()
+        batch["status"] = "done"
+        batch["finished_at"] = time.time()
+        await self._save(batch_id, force=True)
+        self._last_saved.pop(batch_id, None)
+        # Finished batches are served from the persisted copy from now on
+        if self.load is not None:
+            self.batches.pop(batch_id, None)
+
+    @staticmethod
+    def _fail(batch: dict, result: dict, error: str):
+        result["status"] = "failed"
+        result["error"] = error
+        batch["failed"] += 1
+
+
+scheduler = BatchScheduler()
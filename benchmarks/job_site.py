@@ -0,0 +1,75 @@
+"""
+Static job board serving a distinct posting at /jobs/<n>.
+
+Pages have the navigation, scripts and footer of a real job site around
+the posting, so the HTML cleanup does representative work. Postings with
+an odd number embed schema.org JobPosting JSON-LD, the others do not.
+
+    python benchmarks/job_site.py --port 9200
+"""
+import json
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CHROME = "".join(f'<li><a href="/category/{i}">Category {i}</a></li>' for i in range(60))
+SCRIPT = "<script>" + "var tracking = {};" * 200 + "</script>"
+
+
+def job_page(number: int) -> str:
+    title = f"Data Engineer {number}"
+    responsibilities = "".join(
+        f"<li>Design and operate data pipeline {number}-{i} in Python and SQL</li>" for i in range(8)
+    )
+    requirements = "".join(
+        f"<li>{years}+ years with Airflow, dbt and cloud warehouses</li>" for years in range(3, 9)
+    )
+    description = (
+        f"<h1>{title}</h1><p>Acme {number} is hiring a data engineer to build its analytics platform.</p>"
+        f"<h2>Responsibilities</h2><ul>{responsibilities}</ul>"
+        f"<h2>Requirements</h2><ul>{requirements}</ul>"
+    )
+    json_ld = ""
+    if number % 2:
+        json_ld = '<script type="application/ld+json">' + json.dumps({
+            "@context": "https://schema.org",
+            "@type": "JobPosting",
+            "title": title,
+            "description": description,
+            "hiringOrganization": {"@type": "Organization", "name": f"Acme {number}"},
+            "jobLocation": {"@type": "Place", "address": {"addressLocality": "Remote"}},
+        }) + "</script>"
+    return (
+        f"<html><head><title>{title}</title>{SCRIPT}{json_ld}</head><body>"
+        f"<nav><ul>{CHROME}</ul></nav>"
+        f"<main><article>{description}</article></main>"
+        f"<aside><h3>Similar jobs</h3><ul>{CHROME}</ul></aside>"
+        f"<footer>Cookies Privacy Terms {CHROME}</footer></body></html>"
+    )
+
+
+class JobSiteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "jobs" or not parts[1].isdigit():
+            self.send_error(404)
+            return
+        body = job_page(int(parts[1])).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9200)
+    args = parser.parse_args()
+    ThreadingHTTPServer(("127.0.0.1", args.port), JobSiteHandler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
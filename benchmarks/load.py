@@ -0,0 +1,267 @@
+"""
+Offline load test of the API against local stand-ins.
+
+Starts the mock LLM server (benchmarks/mock_llm.py), the static job board
+(benchmarks/job_site.py) and the API itself on SQLite, then runs each
+simulated user through upload_assets, new_application, generate_documents
+and feedback, one endpoint at a time at the given concurrency. Reports
+p50/p95/p99 latency and throughput per endpoint, and the time per stage
+from the API's /metrics.
+
+    python benchmarks/load.py                                 # 16 users, 4 at a time
+    python benchmarks/load.py --users 64 --concurrency 16 --latency 0.5 --tokens-per-second 40
+    python benchmarks/load.py --use-openai --env RANKING_ENABLED=false --json results.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ENDPOINTS = ("upload_assets", "new_application", "generate_documents", "feedback")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list, p: float) -> float:
+    # Nearest-rank percentile
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def profile_text(user: int, kind: str) -> str:
+    # Distinct per user so the parsed document cache does not hide the work
+    paragraphs = [f"{kind.title()} of benchmark user {user}", f"bench{user}@example.com"]
+    for job in range(12):
+        paragraphs.append(
+            f"Company {user}-{job}, Data Engineer ({2010 + job}-{2011 + job})\n"
+            f"- Built pipelines in Python and SQL for team {job}\n"
+            f"- Ran Airflow and dbt on a cloud warehouse, cut costs by {job + 5}%"
+        )
+    return "\n\n".join(paragraphs)
+
+
+async def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not start within {timeout}s")
+
+
+async def wait_for_servers(urls: dict, processes: tuple):
+    await asyncio.gather(
+        wait_until_up(urls["llm"] + "/docs", processes[0]),
+        wait_until_up(urls["site"] + "/", processes[1]),
+        wait_until_up(urls["api"] + "/metrics", processes[2]),
+    )
+
+
+def start_servers(args, workdir: str) -> tuple:
+    llm_port, site_port, api_port = free_port(), free_port(), free_port()
+    log = open(os.path.join(workdir, "servers.log"), "w")
+    llm = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARKS, "mock_llm.py"), "--port", str(llm_port),
+         "--latency", str(args.latency), "--tokens-per-second", str(args.tokens_per_second),
+         "--completion-tokens", str(args.completion_tokens)],
+        stdout=log, stderr=subprocess.STDOUT,
+    )
+    site = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARKS, "job_site.py"), "--port", str(site_port)],
+        stdout=log, stderr=subprocess.STDOUT,
+    )
+    env = dict(os.environ)
+    env.update({
+        "STORAGE_BACKEND": "sqlite",
+        # One worker keeps everything in memory; several need a shared file
+        "SQLITE_PATH": ":memory:" if args.workers == 1 else os.path.join(workdir, "bench.db"),
+        "FILE_STORE": "local",
+        "FILE_STORE_ROOT": os.path.join(workdir, "files"),
+        "CACHE_DIR": os.path.join(workdir, "cache"),
+        "LLM_API_URL": f"http://127.0.0.1:{llm_port}",
+        "OPENAI_API_URL": f"http://127.0.0.1:{llm_port}",
+        "OPENAI_API_KEY": "mock",
+        "USE_OPENAI": "true" if args.use_openai else "false",
+        "LOG_REQUEST_TIMINGS": "false",
+        "WORKERS": str(args.workers),
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(api_port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    urls = {
+        "llm": f"http://127.0.0.1:{llm_port}",
+        "site": f"http://127.0.0.1:{site_port}",
+        "api": f"http://127.0.0.1:{api_port}",
+    }
+    return (llm, site, api), urls
+
+
+async def run_phase(name: str, users: list, request, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = {}
+
+    async def one(user):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await request(user)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+            elif name == "new_application":
+                user["application_id"] = response.json()["application_id"]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(user) for user in users))
+    elapsed = time.perf_counter() - start
+    return {
+        "endpoint": name,
+        "requests": len(users),
+        "errors": errors,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies, default=0.0),
+        "throughput": len(users) / elapsed if elapsed else 0.0,
+        "seconds": elapsed,
+    }
+
+
+def stage_summary(metrics_text: str) -> dict:
+    # Mean seconds per stage and per LLM model from the /metrics histograms
+    sums, counts = {}, {}
+    patterns = (
+        re.compile(r'^jobseeker_stage_seconds_(sum|count)\{stage="([^"]+)",status="ok"\} (\S+)$'),
+        re.compile(r'^jobseeker_llm_request_seconds_(sum|count)\{backend="([^"]+)",model="([^"]+)",streaming="[^"]+"\} (\S+)$'),
+    )
+    for line in metrics_text.splitlines():
+        for pattern in patterns:
+            match = pattern.match(line)
+            if match:
+                kind, *names, value = match.groups()
+                stage = names[0] if len(names) == 1 else "llm." + ".".join(names)
+                target = sums if kind == "sum" else counts
+                target[stage] = target.get(stage, 0) + float(value)
+    return {stage: {"count": int(counts[stage]), "mean": sums[stage] / counts[stage]}
+            for stage in sorted(counts) if counts[stage]}
+
+
+async def run(args, urls: dict) -> dict:
+    api = urls["api"]
+    users = [{"user_id": f"bench-{time.time_ns()}-{n}", "number": n} for n in range(args.users)]
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=api, timeout=args.timeout, limits=limits) as client:
+        requests = {
+            "upload_assets": lambda user: client.post(
+                "/upload_assets",
+                data={"user_id": user["user_id"]},
+                files={kind: (f"{kind}.txt", profile_text(user["number"], kind).encode(), "text/plain")
+                       for kind in ("resume", "linkedin", "experience")},
+            ),
+            "new_application": lambda user: client.post(
+                "/new_application",
+                json={"user_id": user["user_id"], "job_link": f"{urls['site']}/jobs/{user['number']}"},
+            ),
+            "generate_documents": lambda user: client.post(
+                "/generate_documents",
+                json={"user_id": user["user_id"], "application_id": user.get("application_id", "missing")},
+            ),
+            "feedback": lambda user: client.post(
+                "/feedback",
+                json={"user_id": user["user_id"], "application_id": user.get("application_id", "missing"),
+                      "feedback": args.feedback},
+            ),
+        }
+        results = []
+        for name in ENDPOINTS:
+            result = await run_phase(name, users, requests[name], args.concurrency)
+            results.append(result)
+            print_result(result)
+        # With several workers this only covers the worker that answers
+        stages = stage_summary((await client.get("/metrics")).text)
+    return {"settings": vars(args), "endpoints": results, "stages": stages}
+
+
+def print_result(result: dict):
+    errors = sum(result["errors"].values())
+    print(
+        f"{result['endpoint']:<20} {result['requests']:>5} req  {errors:>3} err  "
+        f"p50 {result['p50'] * 1000:8.1f} ms  p95 {result['p95'] * 1000:8.1f} ms  "
+        f"p99 {result['p99'] * 1000:8.1f} ms  {result['throughput']:7.2f} req/s"
+        + (f"  {result['errors']}" if errors else "")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=1, help="API worker processes")
+    parser.add_argument("--latency", type=float, default=0.3, help="mock LLM time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--use-openai", action="store_true", help="generate with the OpenAI client")
+    parser.add_argument("--feedback", default="Make both documents more concise")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the API, e.g. --env LOCAL_LLM_MAX_CONCURRENCY=8")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="jobseeker_bench_") as workdir:
+        processes, urls = start_servers(args, workdir)
+        try:
+            asyncio.run(wait_for_servers(urls, processes))
+            print(f"{args.users} users, concurrency {args.concurrency}, {args.workers} worker(s), "
+                  f"LLM latency {args.latency}s at {args.tokens_per_second:g} tokens/s")
+            results = asyncio.run(run(args, urls))
+        except Exception:
+            with open(os.path.join(workdir, "servers.log")) as f:
+                print(f.read()[-4000:], file=sys.stderr)
+            raise
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=10)
+
+    print("Mean time per stage:")
+    for stage, summary in results["stages"].items():
+        print(f"  {stage:<32} {summary['mean'] * 1000:8.1f} ms  ({summary['count']} calls)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Stand-in for the OpenAI and LMStudio APIs with a configurable speed.
+
+Serves /v1/completions and /v1/chat/completions, streamed or not. Each
+response waits `--latency` seconds before the first token, then produces
+`--completion-tokens` tokens at `--tokens-per-second`. Job extraction
+prompts get a valid job details JSON object back.
+
+    python benchmarks/mock_llm.py --port 9100 --latency 0.3 --tokens-per-second 80
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="Mock LLM")
+settings = {"latency": 0.3, "tokens_per_second": 80.0, "completion_tokens": 200}
+
+WORDS = ("experience", "team", "delivered", "python", "data", "platform", "customers", "growth",
+         "led", "built", "results", "impact", "strategy", "product", "engineering", "the", "and", "with")
+
+
+def job_details_json(prompt: str) -> str:
+    return json.dumps({
+        "company": "Acme",
+        "role": "Senior Data Engineer",
+        "location": "Remote",
+        "salary": "",
+        "description of the role": "Build and run the data platform.",
+        "key responsibilities": ["Design data pipelines", "Own the warehouse", "Mentor engineers"],
+        "requirements": ["Python", "SQL", "Airflow", "5+ years of data engineering"],
+    })
+
+
+def prompt_text(body: dict) -> str:
+    if "messages" in body:
+        return "\n".join(str(message.get("content", "")) for message in body["messages"])
+    return str(body.get("prompt", ""))
+
+
+def completion_tokens(body: dict, prompt: str) -> list:
+    if '"key responsibilities"' in prompt or body.get("response_format"):
+        # One "token" for the whole object keeps the JSON valid when streamed
+        return [job_details_json(prompt)]
+    count = min(settings["completion_tokens"], body.get("max_tokens") or settings["completion_tokens"])
+    return [random.choice(WORDS) + " " for _ in range(count)]
+
+
+def usage(prompt: str, tokens: list) -> dict:
+    prompt_tokens = len(prompt) // 4 + 1
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens)}
+
+
+def choice(chat: bool, text: str, streaming: bool) -> dict:
+    if not chat:
+        return {"index": 0, "text": text, "finish_reason": None}
+    if streaming:
+        return {"index": 0, "delta": {"content": text}, "finish_reason": None}
+    return {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+
+
+async def respond(request: Request, chat: bool):
+    body = await request.json()
+    prompt = prompt_text(body)
+    tokens = completion_tokens(body, prompt)
+    model = body.get("model", "mock-local")
+    delay = 1 / settings["tokens_per_second"] if settings["tokens_per_second"] > 0 else 0
+
+    if not body.get("stream"):
+        await asyncio.sleep(settings["latency"] + delay * len(tokens))
+        return {
+            "id": f"mock-{time.time_ns()}",
+            "object": "chat.completion" if chat else "text_completion",
+            "model": model,
+            "choices": [choice(chat, "".join(tokens), False)],
+            "usage": usage(prompt, tokens),
+        }
+
+    async def events():
+        await asyncio.sleep(settings["latency"])
+        for token in tokens:
+            yield f"data: {json.dumps({'model': model, 'choices': [choice(chat, token, True)]})}\n\n"
+            await asyncio.sleep(delay)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield f"data: {json.dumps({'model': model, 'choices': [], 'usage': usage(prompt, tokens)})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/completions")
+async def completions(request: Request):
+    return await respond(request, chat=False)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    return await respond(request, chat=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=settings["latency"])
+    parser.add_argument("--tokens-per-second", type=float, default=settings["tokens_per_second"])
+    parser.add_argument("--completion-tokens", type=int, default=settings["completion_tokens"])
+    args = parser.parse_args()
+    settings.update(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                    completion_tokens=args.completion_tokens)
+
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
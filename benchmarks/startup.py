@@ -0,0 +1,90 @@
+"""
+Measure how long a fresh interpreter takes to import the API module.
+
+Each run starts a new Python process, imports the module and reports the
+import time and peak memory, then the slowest imports from -X importtime.
+
+    python benchmarks/startup.py            # 10 runs of `import main`
+    python benchmarks/startup.py --runs 20 --module main --top 15
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def probe_env() -> dict:
+    # Offline defaults so the import does not need Firebase credentials
+    env = dict(os.environ)
+    env.setdefault("STORAGE_BACKEND", "sqlite")
+    env.setdefault("SQLITE_PATH", ":memory:")
+    return env
+
+
+def run_once(module: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, module],
+        cwd=ROOT, env=probe_env(), capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int) -> list:
+    # -X importtime writes "import time: self [us] | cumulative | name" to stderr
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=probe_env(), capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    children = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level, and a module's
+        # own line comes after the lines of everything it imported
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if level == 1:
+            children.append((int(cumulative), name.strip()))
+        elif level == 0:
+            if name.strip() == module:
+                rows = children
+            children = []
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    results = [run_once(args.module) for _ in range(args.runs)]
+    seconds = [r["seconds"] for r in results]
+    print(f"import {args.module}: {args.runs} runs")
+    print(f"  min {min(seconds) * 1000:.0f} ms  median {statistics.median(seconds) * 1000:.0f} ms  max {max(seconds) * 1000:.0f} ms")
+    print(f"  peak RSS {statistics.median(r['max_rss_mb'] for r in results):.0f} MB, {results[0]['modules']} modules loaded")
+    print(f"Slowest imports of {args.module}:")
+    for cumulative, name in slowest_imports(args.module, args.top):
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
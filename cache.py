@@ -0,0 +1,244 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# ------------------------------
+# Content-addressed on-disk cache
+# ------------------------------
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Query parameters that do not change the page content
+TRACKING_PARAMS = {"gclid", "fbclid", "mc_cid", "mc_eid", "ref", "src", "source"}
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_text(text: str) -> str:
+    return hash_bytes(text.encode("utf-8"))
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize a job URL so trivially different links share a cache key:
+    lowercase scheme and host, drop fragments, tracking parameters and
+    trailing slashes, and sort the remaining query parameters.
+    """
+    parts = urlsplit(url.strip())
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((
+        parts.scheme.lower(),
+        parts.netloc.lower(),
+        path,
+        urlencode(sorted(query)),
+        "",
+    ))
+
+
+class DiskCache:
+    """
+    JSON values stored one file per key under CACHE_DIR/<namespace>.
+    Entries expire after `ttl` seconds and the least recently used ones
+    are evicted once the namespace grows past `max_bytes`.
+    """
+    def __init__(self, namespace: str, ttl: int = CACHE_TTL_SECONDS, max_bytes: int = CACHE_MAX_BYTES,
+                 directory: str = CACHE_DIR):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.directory = os.path.join(directory, namespace)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if time.time() - entry.get("created", 0) > self.ttl:
+            self._remove(path)
+            self.misses += 1
+            return None
+        # Bump the access time used for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry["value"]
+
+    def set(self, key: str, value):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        data = json.dumps({"created": time.time(), "value": value})
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        # Atomic so concurrent readers never see a partial entry
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+
+    def _entries(self):
+        try:
+            with os.scandir(self.directory) as it:
+                return [e for e in it if e.name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+
+    def _scan_size(self) -> int:
+        return sum(e.stat().st_size for e in self._entries())
+
+    def _evict(self):
+        # Called with the lock held: drop the oldest entries down to 90% of the cap
+        entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime)
+        size = sum(e.stat().st_size for e in entries)
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if size <= target:
+                break
+            try:
+                entry_size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            size -= entry_size
+            self.evictions += 1
+        self._size = size
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries()),
+            "bytes": self._scan_size(),
+        }
+
+
+# ------------------------------
+# In-process cache
+# ------------------------------
+class MemoryCache:
+    """
+    Bounded in-process LRU cache with per-entry TTL. Size is tracked as the
+    JSON-encoded length of each value, and values are copied on the way in
+    and out so callers cannot mutate cached entries.
+    """
+    def __init__(self, name: str, ttl: float, max_bytes: int):
+        self.name = name
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() > entry[0]:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[2])
+
+    def set(self, key: str, value):
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, copy.deepcopy(value))
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+                self.invalidations += 1
+
+    def _drop(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+        }
+
+
+parsed_documents = DiskCache("parsed_documents")
+job_extractions = DiskCache("job_extractions")
+# Job pages served with an ETag or Last-Modified header, revalidated by scraper.fetch
+scraped_pages = DiskCache("scraped_pages")
+
+
+def all_stats() -> dict:
+    return {
+        cache.namespace: cache.stats()
+        for cache in (parsed_documents, job_extractions, scraped_pages)
+    }
@@ -0,0 +1,223 @@
+import os
+import time
+import asyncio
+import hashlib
+import zipfile
+import multiprocessing
+
+# ------------------------------
+# Document text extraction
+# ------------------------------
+# Kept separate from main.py so that extraction processes only import
+# what they need to extract text, not the whole API module.
+
+# Extraction processes running at the same time, per API worker
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Uploads larger than this are rejected before parsing
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Extraction stops after this many pages or characters, whichever comes first
+EXTRACT_MAX_PAGES = int(os.getenv("EXTRACT_MAX_PAGES", "30"))
+EXTRACT_MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", "100000"))
+EXTRACT_TIMEOUT_SECONDS = float(os.getenv("EXTRACT_TIMEOUT_SECONDS", "60"))
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Extraction processes currently running, stopped on shutdown
+_running = set()
+_slots = None
+_start_context = None
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _read_pdf(file_path: str, max_pages: int, max_chars: int, deadline: float):
+    import PyPDF2
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        # Pages are parsed one at a time as they are accessed
+        total = len(pdf_reader.pages)
+        pages = []
+        size = 0
+        for index in range(min(total, max_pages)):
+            if size >= max_chars or time.time() > deadline:
+                break
+            text = pdf_reader.pages[index].extract_text() or ''
+            pages.append(text)
+            size += len(text)
+    if len(pages) < total:
+        print(f"Read {len(pages)} of {total} pages from {os.path.basename(file_path)}")
+    return '\n'.join(pages)
+
+
+def _read_docx(file_path: str, max_chars: int, deadline: float):
+    from xml.etree.ElementTree import iterparse
+    paragraphs = []
+    size = 0
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as xml:
+        parts = []
+        # Stream the XML and drop each paragraph once read, so memory stays
+        # flat regardless of the document size
+        for event, element in iterparse(xml, events=("end",)):
+            if element.tag == f"{WORD_NAMESPACE}t":
+                parts.append(element.text or '')
+            elif element.tag == f"{WORD_NAMESPACE}tab":
+                parts.append('\t')
+            elif element.tag in (f"{WORD_NAMESPACE}br", f"{WORD_NAMESPACE}cr"):
+                parts.append('\n')
+            elif element.tag == f"{WORD_NAMESPACE}p":
+                paragraph = ''.join(parts)
+                parts = []
+                element.clear()
+                paragraphs.append(paragraph)
+                size += len(paragraph) + 1
+                if size >= max_chars or time.time() > deadline:
+                    break
+    return '\n'.join(paragraphs)
+
+
+def _read_text(file_path: str, max_chars: int):
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+        return file.read(max_chars)
+
+
+def read_file_content(file_path, max_pages: int = EXTRACT_MAX_PAGES, max_chars: int = EXTRACT_MAX_CHARS,
+                      timeout: float = EXTRACT_TIMEOUT_SECONDS):
+    """
+    Extract the text of a PDF, DOCX or plain text file, reading at most
+    `max_pages` pages and `max_chars` characters. Reading stops early once
+    `timeout` seconds have passed, keeping what was read so far.
+    """
+    deadline = time.time() + timeout
+    extension = os.path.splitext(file_path)[1].lower()
+    try:
+        if extension == '.pdf':
+            text = _read_pdf(file_path, max_pages, max_chars, deadline)
+        elif extension == '.docx':
+            text = _read_docx(file_path, max_chars, deadline)
+        else:
+            text = _read_text(file_path, max_chars)
+    except Exception as e:
+        print(f"Error reading {extension or 'text'} file: {e}")
+        return None
+    if len(text) > max_chars:
+        print(f"Truncated {os.path.basename(file_path)} to {max_chars} characters")
+        text = text[:max_chars]
+    return text
+
+
+def _extract_worker(connection, file_path: str):
+    try:
+        connection.send(read_file_content(file_path))
+    finally:
+        connection.close()
+
+
+def _context():
+    """
+    Start method for extraction processes. Forking would copy the running
+    API worker, whose other threads may hold locks at fork time; the fork
+    server is itself a fresh process that has only imported this module.
+    """
+    global _start_context
+    if _start_context is None:
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            _start_context = multiprocessing.get_context("forkserver")
+            _start_context.set_forkserver_preload(["documents"])
+        else:
+            _start_context = multiprocessing.get_context("spawn")
+    return _start_context
+
+
+def _wait_result(receiver, timeout: float):
+    # Blocking; the receiving end is closed here once the wait is over
+    try:
+        if not receiver.poll(timeout):
+            return "timeout", None
+        return "done", receiver.recv()
+    except EOFError:
+        # Exited without sending a result
+        return "crashed", None
+    finally:
+        receiver.close()
+
+
+async def _extract_in_process(file_path: str):
+    """
+    Run read_file_content in a process of its own, so that a file that
+    hangs the parser can be killed without affecting other extractions.
+    Returns `(status, text, exit_code)` with status "done", "timeout" or
+    "crashed".
+    """
+    context = _context()
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_extract_worker, args=(sender, file_path), daemon=True)
+    process.start()
+    sender.close()
+    _running.add(process)
+    try:
+        # The worker stops on its own at the deadline; allow some slack before killing it
+        status, text = await asyncio.to_thread(_wait_result, receiver, EXTRACT_TIMEOUT_SECONDS + 10)
+    finally:
+        # Also reached on cancellation: killing the process ends the wait in the thread
+        _running.discard(process)
+        if process.is_alive():
+            process.terminate()
+        await asyncio.to_thread(process.join, 5)
+    return status, text, process.exitcode
+
+
+def shutdown_extractions():
+    """
+    Stop the extraction processes still running.
+    """
+    for process in list(_running):
+        process.terminate()
+
+
+async def extract_text(file_path: str):
+    """
+    Extract the text of a document without blocking the event loop.
+    PDF and DOCX parsing is CPU-bound so it runs in a separate process,
+    at most PDF_WORKERS at a time, with a hard timeout on top of the
+    deadline checked between pages; plain text files are read in a thread.
+    """
+    global _slots
+    if os.path.splitext(file_path)[1].lower() not in ('.pdf', '.docx'):
+        return await asyncio.to_thread(read_file_content, file_path)
+    if _slots is None:
+        _slots = asyncio.Semaphore(PDF_WORKERS)
+    name = os.path.basename(file_path)
+    async with _slots:
+        status, text, exit_code = await _extract_in_process(file_path)
+    if status == "timeout":
+        print(f"Timed out extracting text from {name}")
+    elif status == "crashed":
+        # Not retried: a file that crashes or exhausts the parser would do it again
+        print(f"Extraction process for {name} exited with code {exit_code}")
+    return text
+
+
+async def save_upload(upload, path: str) -> str:
+    """
+    Stream an uploaded file to disk in chunks instead of reading it
+    into memory at once. Returns the SHA-256 of the file content and
+    raises UploadTooLarge past MAX_UPLOAD_BYTES.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise UploadTooLarge(
+                        f"{upload.filename} is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+                    )
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+    finally:
+        await upload.close()
+    return digest.hexdigest()
@@ -0,0 +1,131 @@
+import os
+import shutil
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ------------------------------
+# Artifact storage (uploaded assets, generated documents)
+# ------------------------------
+# Files are addressed by keys such as "applications/<id>/cover_letter.txt"
+# rather than node-local paths, so any worker on any node can read what
+# another one wrote. "local" keeps them under FILE_STORE_ROOT (the working
+# directory by default, matching the historical layout); "s3" stores them
+# in an S3-compatible bucket such as MinIO.
+FILE_STORE = os.getenv("FILE_STORE", "local").lower()
+FILE_STORE_ROOT = os.getenv("FILE_STORE_ROOT", ".")
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://localhost:9000 for MinIO
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+
+
+class FileStore:
+    """
+    Key/value storage for files. Keys use forward slashes.
+    """
+    def put_file(self, key: str, local_path: str):
+        """
+        Store the file at `local_path` under `key`. The local file may be
+        moved, so callers should not use it afterwards.
+        """
+        raise NotImplementedError
+
+    def write_text(self, key: str, text: str):
+        raise NotImplementedError
+
+    def read_text(self, key: str):
+        """
+        Return the content stored under `key`, or None if it does not exist.
+        """
+        raise NotImplementedError
+
+
+class LocalFileStore(FileStore):
+    def __init__(self, root: str = FILE_STORE_ROOT):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if os.path.relpath(path, self.root).startswith(".."):
+            raise ValueError(f"Invalid file key: {key}")
+        return path
+
+    def put_file(self, key: str, local_path: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.move(local_path, path)
+
+    def write_text(self, key: str, text: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers in other workers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def read_text(self, key: str):
+        try:
+            with open(self._path(key), "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class S3FileStore(FileStore):
+    """
+    Files in an S3-compatible bucket. Credentials come from the usual AWS
+    environment variables; boto3 is imported on first use.
+    """
+    def __init__(self, bucket: str = S3_BUCKET, endpoint_url: str = S3_ENDPOINT_URL, prefix: str = S3_PREFIX):
+        if not bucket:
+            raise ValueError("S3_BUCKET must be set when FILE_STORE=s3")
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.prefix = prefix
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import boto3
+                self._client = boto3.client("s3", endpoint_url=self.endpoint_url)
+        return self._client
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def put_file(self, key: str, local_path: str):
+        self.client.upload_file(local_path, self.bucket, self._key(key))
+        os.remove(local_path)
+
+    def write_text(self, key: str, text: str):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=text.encode("utf-8"))
+
+    def read_text(self, key: str):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read().decode("utf-8")
+
+
+_file_store = None
+
+
+def get_file_store() -> FileStore:
+    """
+    File store selected by FILE_STORE, created once per process.
+    """
+    global _file_store
+    if _file_store is None:
+        if FILE_STORE == "local":
+            _file_store = LocalFileStore()
+        elif FILE_STORE == "s3":
+            _file_store = S3FileStore()
+        else:
+            raise ValueError(f"Unknown FILE_STORE: {FILE_STORE}")
+    return _file_store
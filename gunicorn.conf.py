@@ -0,0 +1,24 @@
+import os
+
+# ------------------------------
+# Multi-worker deployment: gunicorn main:app -c gunicorn.conf.py
+# ------------------------------
+# Each worker is a separate process with its own event loop, LLM client pool
+# and PDF process pool. Shared state lives in the repository (STORAGE_BACKEND)
+# and the file store (FILE_STORE), so any worker can serve any request.
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", os.getenv("WORKERS", "2")))
+# Workers inherit this environment: the per-process document cache would
+# serve documents other workers have changed (see storage.py)
+if workers > 1:
+    os.environ.setdefault("DOCUMENT_CACHE_ENABLED", "false")
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Load the app in each worker after the fork, so clients, pools and
+# database connections are never shared between processes
+preload_app = False
+
+# Generations and SSE streams can run for minutes
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+graceful_timeout = 30
+keepalive = 5
@@ -0,0 +1,148 @@
+import re
+import ast
+import json
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+# ------------------------------
+# Job details schema
+# ------------------------------
+# Job details are stored and sent to prompts with the historical field
+# names ("description of the role", "key responsibilities"...), which are
+# the aliases of the model fields below.
+
+
+class JobDetails(BaseModel):
+    model_config = ConfigDict(populate_by_name=True, extra="ignore")
+
+    company: str = ""
+    role: str = ""
+    location: str = ""
+    salary: str = ""
+    description: str = Field("", alias="description of the role")
+    responsibilities: list[str] = Field(default_factory=list, alias="key responsibilities")
+    requirements: list[str] = Field(default_factory=list)
+
+    @field_validator("company", "role", "location", "salary", "description", mode="before")
+    @classmethod
+    def _as_text(cls, value):
+        if value is None:
+            return ""
+        if isinstance(value, list):
+            return ", ".join(str(item) for item in value if item)
+        return str(value).strip()
+
+    @field_validator("responsibilities", "requirements", mode="before")
+    @classmethod
+    def _as_items(cls, value):
+        if value is None or value == "":
+            return []
+        if isinstance(value, str):
+            # One item per line, without bullets
+            return [line.strip(" -*•\t") for line in value.splitlines() if line.strip(" -*•\t")]
+        if isinstance(value, list):
+            return [str(item).strip() for item in value if item not in (None, "")]
+        return [str(value)]
+
+    def is_complete(self) -> bool:
+        """
+        Whether the extraction found enough to tailor documents with.
+        """
+        return bool(self.role and (self.requirements or self.responsibilities or self.description))
+
+    def to_dict(self) -> dict:
+        return self.model_dump(by_alias=True)
+
+
+FIELD_NAMES = [field.alias or name for name, field in JobDetails.model_fields.items()]
+
+# Structured outputs schema; strict mode wants every field required
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "job_details",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                name: {"type": "array", "items": {"type": "string"}}
+                if name in ("key responsibilities", "requirements") else {"type": "string"}
+                for name in FIELD_NAMES
+            },
+            "required": FIELD_NAMES,
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+def _close_brackets(text: str) -> str:
+    # Close strings, arrays and objects left open by a truncated response
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = re.sub(r",\s*$", "", text)
+    return text + "".join(reversed(stack))
+
+
+def _candidates(text: str):
+    text = text.strip()
+    # Markdown code fences
+    fenced = re.search(r"```(?:json)?\s*(.*?)(?:```|$)", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1).strip()
+    start = text.find("{")
+    if start > 0:
+        text = text[start:]
+    end = text.rfind("}")
+    yield text
+    if end != -1:
+        yield text[:end + 1]
+    repaired = text.replace("“", '"').replace("”", '"').replace("’", "'")
+    repaired = re.sub(r",\s*([}\]])", r"\1", repaired)
+    yield repaired
+    yield _close_brackets(repaired)
+
+
+def parse(text: str) -> JobDetails:
+    """
+    Parse and validate a model response into JobDetails, repairing the
+    usual near misses: code fences, text around the object, trailing
+    commas, curly quotes, Python-style literals and truncated output.
+    Raises ValueError when the response cannot be recovered.
+    """
+    if not text or "{" not in text:
+        raise ValueError("No JSON object in the response")
+    error = None
+    for candidate in _candidates(text):
+        try:
+            data = json.loads(candidate)
+        except ValueError as e:
+            try:
+                data = ast.literal_eval(candidate)
+            except (ValueError, SyntaxError):
+                error = e
+                continue
+        if not isinstance(data, dict):
+            error = ValueError("The response is not a JSON object")
+            continue
+        try:
+            return JobDetails.model_validate(data)
+        except ValidationError as e:
+            error = e
+    raise ValueError(f"Invalid job details: {error}")
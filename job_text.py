@@ -0,0 +1,256 @@
+import re
+import json
+import job_schema
+
+# ------------------------------
+# Job page preprocessing
+# ------------------------------
+# Shrinks a career page down to the posting itself before it is sent to the
+# LLM, and skips the LLM entirely when the page embeds schema.org
+# JobPosting data.
+
+_html_parser = None
+
+BOILERPLATE_TAGS = [
+    "script", "style", "noscript", "template", "svg", "iframe", "canvas",
+    "nav", "aside", "form", "button", "select",
+]
+# Page-level only: inside the posting these often hold the title
+PAGE_CHROME_TAGS = ["header", "footer"]
+BOILERPLATE_PATTERN = re.compile(
+    r"cookie|consent|gdpr|banner|newsletter|subscribe|social|share|breadcrumb|"
+    r"modal|popup|navbar|nav-|menu|footer|sidebar|related|recommend",
+    re.IGNORECASE,
+)
+RESPONSIBILITIES_PATTERN = re.compile(r"responsibilit|what you.?ll do|your role|the role|day.to.day|you will", re.IGNORECASE)
+REQUIREMENTS_PATTERN = re.compile(r"requirement|qualification|what you.?ll bring|you have|skills|experience|about you", re.IGNORECASE)
+
+# Running totals of how much text the preprocessing removed
+stats = {
+    "pages": 0,
+    "json_ld_pages": 0,
+    "raw_tokens": 0,
+    "clean_tokens": 0,
+}
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text
+    return len(text) // 4
+
+
+def parse_html(html: str):
+    """
+    Parse HTML with lxml when it is installed. BeautifulSoup and lxml are
+    imported on first use to keep worker startup fast.
+    """
+    global _html_parser
+    from bs4 import BeautifulSoup
+    if _html_parser is None:
+        try:
+            import lxml  # noqa: F401
+            _html_parser = "lxml"
+        except ImportError:
+            _html_parser = "html.parser"
+    return BeautifulSoup(html, _html_parser)
+
+
+def _jsonld_objects(soup):
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(script.string or "")
+        except ValueError:
+            continue
+        stack = [data]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, dict):
+                yield item
+                if "@graph" in item:
+                    stack.append(item["@graph"])
+
+
+def find_job_posting(soup):
+    """
+    Return the first schema.org JobPosting object embedded as JSON-LD, if any.
+    """
+    for item in _jsonld_objects(soup):
+        types = item.get("@type")
+        types = types if isinstance(types, list) else [types]
+        if "JobPosting" in types:
+            return item
+    return None
+
+
+def _html_to_text(fragment: str) -> str:
+    return parse_html(fragment or "").get_text(separator="\n").strip()
+
+
+def _as_list(value) -> list:
+    """
+    Normalize a JSON-LD field that may be a string (possibly HTML), a list or missing.
+    """
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [item for v in value for item in _as_list(v)]
+    if isinstance(value, dict):
+        value = value.get("name") or value.get("description") or ""
+    soup = parse_html(str(value))
+    items = [li.get_text(" ", strip=True) for li in soup.find_all("li")]
+    if not items:
+        items = [line.strip(" -•*\t") for line in soup.get_text("\n").splitlines()]
+    return [item for item in items if item]
+
+
+def _section_lists(description_html: str):
+    """
+    Pull bullet lists that follow "Responsibilities"/"Requirements"-style
+    headings out of a posting description.
+    """
+    responsibilities = []
+    requirements = []
+    soup = parse_html(description_html or "")
+    for ul in soup.find_all(["ul", "ol"]):
+        heading = ul.find_previous(["h1", "h2", "h3", "h4", "h5", "h6", "strong", "b", "p"])
+        title = heading.get_text(" ", strip=True) if heading else ""
+        items = [li.get_text(" ", strip=True) for li in ul.find_all("li")]
+        if RESPONSIBILITIES_PATTERN.search(title):
+            responsibilities.extend(items)
+        elif REQUIREMENTS_PATTERN.search(title):
+            requirements.extend(items)
+    return responsibilities, requirements
+
+
+def _location(posting: dict) -> str:
+    locations = posting.get("jobLocation") or []
+    if isinstance(locations, dict):
+        locations = [locations]
+    parts = []
+    for location in locations:
+        address = location.get("address", {}) if isinstance(location, dict) else {}
+        if isinstance(address, str):
+            parts.append(address)
+            continue
+        country = address.get("addressCountry")
+        if isinstance(country, dict):
+            country = country.get("name")
+        fields = [address.get("addressLocality"), address.get("addressRegion"), country]
+        parts.append(", ".join(f for f in fields if f))
+    if posting.get("jobLocationType") == "TELECOMMUTE":
+        parts.append("Remote")
+    return "; ".join(p for p in parts if p)
+
+
+def _salary(posting: dict) -> str:
+    salary = posting.get("baseSalary")
+    if not salary:
+        return ""
+    if not isinstance(salary, dict):
+        return str(salary)
+    currency = salary.get("currency", "")
+    value = salary.get("value", {})
+    if not isinstance(value, dict):
+        return f"{value} {currency}".strip()
+    low, high = value.get("minValue"), value.get("maxValue")
+    amount = f"{low}-{high}" if low and high else str(value.get("value") or low or high or "")
+    unit = value.get("unitText", "")
+    return " ".join(p for p in [amount, currency, f"per {unit.lower()}" if unit else ""] if p)
+
+
+def job_details_from_posting(posting: dict) -> dict:
+    """
+    Map a JobPosting object to the fields returned by the LLM extraction.
+    """
+    organization = posting.get("hiringOrganization") or {}
+    company = organization.get("name", "") if isinstance(organization, dict) else str(organization)
+    description_html = posting.get("description", "")
+    responsibilities, requirements = _section_lists(description_html)
+    return {
+        "company": company,
+        "role": posting.get("title", ""),
+        "location": _location(posting),
+        "salary": _salary(posting),
+        "description of the role": _html_to_text(description_html),
+        "key responsibilities": _as_list(posting.get("responsibilities")) or responsibilities,
+        "requirements": (
+            _as_list(posting.get("qualifications"))
+            + _as_list(posting.get("skills"))
+            + _as_list(posting.get("experienceRequirements"))
+            + _as_list(posting.get("educationRequirements"))
+        ) or requirements,
+    }
+
+
+def clean_text(soup) -> str:
+    """
+    Strip navigation, scripts, cookie banners and other boilerplate and
+    return the text of the main content.
+    """
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+    for tag in soup(PAGE_CHROME_TAGS):
+        if not tag.decomposed and not tag.find_parent(["main", "article"]):
+            tag.decompose()
+    for tag in soup.find_all(attrs={"class": BOILERPLATE_PATTERN}) + soup.find_all(attrs={"id": BOILERPLATE_PATTERN}):
+        # Never drop the main content container itself
+        if tag.decomposed or tag.name in ("html", "body", "main", "article"):
+            continue
+        tag.decompose()
+
+    root = soup.find("main") or soup.find("article") or soup.find(attrs={"role": "main"}) or soup
+    text = root.get_text(separator="\n")
+    if root is not soup and len(text.strip()) < 200:
+        # The main landmark is nearly empty (content rendered elsewhere)
+        text = soup.get_text(separator="\n")
+
+    lines = []
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if line and (not lines or line != lines[-1]):
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def preprocess_job_page(html: str) -> dict:
+    """
+    Reduce a job page to what the extraction needs.
+
+    Returns a dict with the cleaned `text`, `job_details` when the page has
+    JobPosting structured data complete enough to skip the LLM extraction
+    (None otherwise) and the token counts before and after cleaning.
+    """
+    soup = parse_html(html)
+    raw_tokens = estimate_tokens(soup.get_text(separator="\n"))
+
+    posting = find_job_posting(soup)
+    job_details = None
+    if posting:
+        details = job_schema.JobDetails.model_validate(job_details_from_posting(posting))
+        # A posting with little more than a title still needs the LLM on the page text
+        job_details = details.to_dict() if details.is_complete() else None
+    text = clean_text(soup)
+    clean_tokens = 0 if job_details else estimate_tokens(text)
+
+    stats["pages"] += 1
+    stats["json_ld_pages"] += 1 if job_details else 0
+    stats["raw_tokens"] += raw_tokens
+    stats["clean_tokens"] += clean_tokens
+    return {
+        "text": text,
+        "job_details": job_details,
+        "raw_tokens": raw_tokens,
+        "clean_tokens": clean_tokens,
+        "reduction": round(1 - clean_tokens / raw_tokens, 3) if raw_tokens else 0.0,
+        "source": "json-ld" if job_details else "html",
+    }
+
+
+def summary() -> dict:
+    raw = stats["raw_tokens"]
+    return {
+        **stats,
+        "reduction": round(1 - stats["clean_tokens"] / raw, 3) if raw else 0.0,
+    }
@@ -0,0 +1,131 @@
+import os
+import time
+import uuid
+import asyncio
+
+# ------------------------------
+# Background job queue
+# ------------------------------
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    In-process queue for long-running work such as document generation.
+
+    Handlers are registered per job kind with `register(kind, handler)`;
+    a handler is an async function taking the job params as keyword
+    arguments and returning a JSON-serializable result. Every state change
+    (queued, running, done, failed) is passed to `persist(job)` so the
+    status can be read back even after the in-memory copy is gone.
+    """
+    def __init__(self, persist=None, load=None, workers: int = JOB_WORKERS, max_size: int = JOB_QUEUE_SIZE):
+        self.persist = persist
+        self.load = load
+        self.workers = workers
+        self.max_size = max_size
+        self.handlers = {}
+        self.jobs = {}
+        self._queue = None
+        self._tasks = []
+
+    def register(self, kind: str, handler):
+        self.handlers[kind] = handler
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Jobs that never started would otherwise stay "queued" for good
+        while self._queue is not None and not self._queue.empty():
+            job = self.jobs[self._queue.get_nowait()]
+            await self._finish_failed(job, "Worker shut down before the job started")
+
+    async def submit(self, kind: str, params: dict) -> dict:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue.full():
+            raise QueueFull(f"Job queue is full ({self.max_size} jobs)")
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "kind": kind,
+            "status": "queued",
+            "params": params,
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        self.jobs[job["job_id"]] = job
+        await self._save(job)
+        try:
+            self._queue.put_nowait(job["job_id"])
+        except asyncio.QueueFull:
+            # Other submissions filled the queue while this job was saved
+            self.jobs.pop(job["job_id"], None)
+            await self._finish_failed(job, "Job queue is full")
+            raise QueueFull(f"Job queue is full ({self.max_size} jobs)")
+        return job
+
+    async def get(self, job_id: str):
+        job = self.jobs.get(job_id)
+        if job is None and self.load is not None:
+            job = await asyncio.to_thread(self.load, job_id)
+        return job
+
+    async def _save(self, job: dict):
+        if self.persist is None:
+            return
+        try:
+            await asyncio.to_thread(self.persist, dict(job))
+        except Exception as e:
+            print(f"Error persisting job {job['job_id']}: {e}")
+
+    async def _finish_failed(self, job: dict, detail: str):
+        job["status"] = "failed"
+        job["error"] = {"detail": detail, "retryable": True}
+        job["finished_at"] = time.time()
+        await self._save(job)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs[job_id]
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            await self._save(job)
+            try:
+                job["result"] = await self.handlers[job["kind"]](**job["params"])
+                job["status"] = "done"
+            except asyncio.CancelledError:
+                job["status"] = "failed"
+                job["error"] = {"detail": "Worker shut down", "retryable": True}
+                await self._save(job)
+                raise
+            except Exception as e:
+                print(f"Error running job {job_id}: {e}")
+                status_code = getattr(e, "status_code", 500)
+                job["status"] = "failed"
+                job["error"] = {
+                    "detail": getattr(e, "detail", None) or str(e),
+                    "status_code": status_code,
+                    # A bad request fails the same way again, except rate limiting
+                    "retryable": getattr(e, "retryable", status_code >= 500 or status_code == 429),
+                }
+            job["finished_at"] = time.time()
+            await self._save(job)
+            # Finished jobs are served from the persisted copy from now on
+            if self.load is not None:
+                self.jobs.pop(job_id, None)
+            self._queue.task_done()
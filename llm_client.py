@@ -0,0 +1,347 @@
+import os
+import json
+import asyncio
+import random
+import time
+import httpx
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+# ------------------------------
+# Configuration
+# ------------------------------
+LLM_API_URL = os.getenv("LLM_API_URL")
+# Several LMStudio servers can share the local load: comma-separated base URLs
+LLM_API_URLS = [url.strip() for url in os.getenv("LLM_API_URLS", LLM_API_URL or "").split(",") if url.strip()]
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com")
+
+# Generations on the reasoning models can take minutes, so the read timeout is generous
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "600"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+
+# LMStudio serves one generation at a time well; OpenAI can take many in parallel.
+# The local limit applies to each LMStudio server.
+LOCAL_LLM_MAX_CONCURRENCY = int(os.getenv("LOCAL_LLM_MAX_CONCURRENCY", "2"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Weight of the latest call in the moving average of a backend's latency
+LATENCY_SMOOTHING = 0.3
+
+
+class LLMError(Exception):
+    """
+    Raised when an LLM backend cannot produce a response after all retries.
+    """
+    def __init__(self, backend: str, message: str, status_code: int = None):
+        super().__init__(f"{backend}: {message}")
+        self.backend = backend
+        self.status_code = status_code
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code is None or self.status_code in RETRYABLE_STATUS_CODES
+
+
+class LLMClient:
+    """
+    Pooled async HTTP client for one LLM backend.
+    Keeps connections alive between calls, caps the number of in-flight
+    requests and retries transient failures with exponential backoff.
+    Also tracks its load and moving averages of its full-call latency, which
+    the router uses to pick a backend, and of the time to the first
+    streamed token.
+    """
+    def __init__(self, name: str, base_url: str, headers: dict = None, max_concurrency: int = 4):
+        self.name = name
+        self.base_url = base_url
+        self.headers = headers or {}
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.latency = None
+        self.first_token_latency = None
+        self.calls = 0
+        self.errors = 0
+        self.last_finished = 0.0
+        self._client = None
+        self._semaphore = None
+
+    @property
+    def saturated(self) -> bool:
+        # New calls would wait for a free slot
+        return self.in_flight >= self.max_concurrency
+
+    @property
+    def load(self) -> float:
+        return self.in_flight / self.max_concurrency
+
+    @staticmethod
+    def _smoothed(average, seconds: float) -> float:
+        if average is None:
+            return seconds
+        return average + LATENCY_SMOOTHING * (seconds - average)
+
+    def _finished(self, seconds: float, error: bool, first_token: float = None):
+        """
+        Record the end of a call. `seconds` is the full call duration, or
+        None when the call did not run to completion (a stream closed early).
+        """
+        self.in_flight -= 1
+        self.calls += 1
+        self.last_finished = time.monotonic()
+        if error:
+            self.errors += 1
+            return
+        if first_token is not None:
+            self.first_token_latency = self._smoothed(self.first_token_latency, first_token)
+        if seconds is not None:
+            self.latency = self._smoothed(self.latency, seconds)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "latency_seconds": round(self.latency, 3) if self.latency is not None else None,
+            "first_token_seconds": round(self.first_token_latency, 3) if self.first_token_latency is not None else None,
+            "calls": self.calls,
+            "errors": self.errors,
+        }
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so the client is bound to the running event loop
+        if self._client is None:
+            if not self.base_url:
+                raise LLMError(self.name, "no base URL configured")
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def post_json(self, path: str, payload: dict) -> dict:
+        """
+        POST a JSON payload and return the decoded JSON response,
+        retrying on connection errors and retryable status codes.
+        The call and its token usage are recorded in the metrics.
+        """
+        start = time.time()
+        began = time.perf_counter()
+        self.in_flight += 1
+        try:
+            data = await self._post_json(path, payload)
+        except BaseException as e:
+            seconds = time.perf_counter() - began
+            self._finished(seconds, error=True)
+            metrics.record_llm_call(self.name, payload.get("model"), seconds, error=str(e) or type(e).__name__,
+                                    start=start)
+            raise
+        seconds = time.perf_counter() - began
+        self._finished(seconds, error=False)
+        metrics.record_llm_call(self.name, payload.get("model"), seconds, usage=data.get("usage"), start=start)
+        return data
+
+    async def _post_json(self, path: str, payload: dict) -> dict:
+        client = self._get_client()
+        last_error = None
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            if attempt:
+                metrics.llm_retries.inc(backend=self.name)
+                await asyncio.sleep(self._backoff(attempt, last_error))
+            try:
+                async with self._semaphore:
+                    response = await client.post(path, json=payload)
+            except httpx.TransportError as e:
+                last_error = LLMError(self.name, f"request failed: {e!r}")
+                continue
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                last_error = LLMError(self.name, f"HTTP {response.status_code}: {response.text[:500]}", response.status_code)
+                last_error.retry_after = response.headers.get("retry-after")
+                continue
+            if response.status_code >= 400:
+                raise LLMError(self.name, f"HTTP {response.status_code}: {response.text[:500]}", response.status_code)
+            return response.json()
+        raise last_error
+
+    async def stream_events(self, path: str, payload: dict):
+        """
+        POST a streaming request and yield each decoded server-sent event.
+        Only establishing the stream is retried: once tokens have been
+        relayed to the caller a failure is raised as is.
+        """
+        start = time.time()
+        began = time.perf_counter()
+        first_token = None
+        usage = None
+        events = 0
+        error = None
+        completed = False
+        self.in_flight += 1
+        try:
+            async for event in self._stream_events(path, payload):
+                if first_token is None:
+                    first_token = time.perf_counter() - began
+                if event.get("usage"):
+                    usage = event["usage"]
+                events += 1
+                yield event
+            completed = True
+        except LLMError as e:
+            error = str(e)
+            raise
+        finally:
+            # Only the full duration goes into the latency the router compares
+            # with non-streaming calls; time to first token is tracked apart
+            self._finished(time.perf_counter() - began if completed else None,
+                           error=error is not None, first_token=first_token)
+            # Without a usage event, count one completion token per streamed delta
+            metrics.record_llm_call(self.name, payload.get("model"), time.perf_counter() - began,
+                                    usage=usage or {"completion_tokens": events}, error=error,
+                                    streaming=True, first_token=first_token, start=start)
+
+    async def _stream_events(self, path: str, payload: dict):
+        client = self._get_client()
+        last_error = None
+        started = False
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            if attempt:
+                metrics.llm_retries.inc(backend=self.name)
+                await asyncio.sleep(self._backoff(attempt, last_error))
+            try:
+                async with self._semaphore:
+                    async with client.stream("POST", path, json=payload) as response:
+                        if response.status_code >= 400:
+                            body = (await response.aread()).decode("utf-8", "replace")
+                            last_error = LLMError(self.name, f"HTTP {response.status_code}: {body[:500]}", response.status_code)
+                            last_error.retry_after = response.headers.get("retry-after")
+                            if not last_error.retryable:
+                                raise last_error
+                            continue
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                return
+                            started = True
+                            yield json.loads(data)
+                        return
+            except httpx.TransportError as e:
+                last_error = LLMError(self.name, f"stream failed: {e!r}")
+                if started:
+                    raise last_error
+        raise last_error
+
+    def _backoff(self, attempt: int, error: LLMError = None) -> float:
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        delay = LLM_BACKOFF_BASE * (2 ** (attempt - 1))
+        return delay + random.uniform(0, delay / 2)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._semaphore = None
+
+
+local_clients = [
+    LLMClient(
+        "lmstudio" if len(LLM_API_URLS) < 2 else f"lmstudio-{index}",
+        url,
+        max_concurrency=LOCAL_LLM_MAX_CONCURRENCY,
+    )
+    for index, url in enumerate(LLM_API_URLS or [None])
+]
+local_client = local_clients[0]
+openai_client = LLMClient(
+    "openai",
+    OPENAI_API_URL,
+    headers={
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json",
+    },
+    max_concurrency=OPENAI_MAX_CONCURRENCY,
+)
+
+
+async def local_completion(prompt: str, client: LLMClient = None, **params) -> dict:
+    """
+    Call the LMStudio completions endpoint.
+    """
+    payload = {"prompt": prompt, "stream": False, **params}
+    return await (client or local_client).post_json("/v1/completions", payload)
+
+
+async def local_chat(messages: list, client: LLMClient = None, **params) -> dict:
+    """
+    Call the LMStudio chat completions endpoint.
+    """
+    payload = {"messages": messages, "stream": False, **params}
+    return await (client or local_client).post_json("/v1/chat/completions", payload)
+
+
+async def openai_chat(messages: list, model: str = "gpt-4o-mini", client: LLMClient = None, **params) -> dict:
+    """
+    Call the OpenAI chat completions endpoint.
+    """
+    payload = {"model": model, "messages": messages, **params}
+    return await (client or openai_client).post_json("/v1/chat/completions", payload)
+
+
+async def stream_local_completion(prompt: str, client: LLMClient = None, **params):
+    """
+    Stream text deltas from the LMStudio completions endpoint.
+    """
+    payload = {"prompt": prompt, "stream": True, **params}
+    async for event in (client or local_client).stream_events("/v1/completions", payload):
+        text = (event.get("choices") or [{}])[0].get("text")
+        if text:
+            yield text
+
+
+async def stream_local_chat(messages: list, client: LLMClient = None, **params):
+    """
+    Stream content deltas from the LMStudio chat completions endpoint.
+    """
+    payload = {"messages": messages, "stream": True, **params}
+    async for event in (client or local_client).stream_events("/v1/chat/completions", payload):
+        content = (event.get("choices") or [{}])[0].get("delta", {}).get("content")
+        if content:
+            yield content
+
+
+async def stream_openai_chat(messages: list, model: str = "gpt-4o-mini", client: LLMClient = None, **params):
+    """
+    Stream content deltas from the OpenAI chat completions endpoint.
+    """
+    # Ask for a final usage event so streamed calls are counted like the others
+    payload = {"model": model, "messages": messages, "stream": True,
+               "stream_options": {"include_usage": True}, **params}
+    async for event in (client or openai_client).stream_events("/v1/chat/completions", payload):
+        content = (event.get("choices") or [{}])[0].get("delta", {}).get("content")
+        if content:
+            yield content
+
+
+async def close_clients():
+    """
+    Close the pooled connections (called on application shutdown).
+    """
+    for client in local_clients:
+        await client.aclose()
+    await openai_client.aclose()
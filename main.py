@@ -1,48 +1,69 @@
 import os
 import uuid
 import json
-import requests
-import uvicorn
+import time
 import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from firebase_admin import credentials, firestore
-import firebase_admin
+from typing import Optional, Literal
 from dotenv import load_dotenv
-import PyPDF2
-from bs4 import BeautifulSoup
-import openai
 import re
-import streamlit as st
+import shutil
+import tempfile
+import llm_client
+import documents
+import cache
+import batch
+import jobs
+import job_text
+import prompts
+import storage
+import file_store
+import ranking
+import metrics
+import routing
+import job_schema
+import scraper
+import versions
 
 load_dotenv()
 
-# Initialize Firebase Admin SDK (make sure to provide the correct path to your credentials JSON)
-cred = credentials.Certificate("./firebase_credentials.json")
-firebase_admin.initialize_app(cred)
-db = firestore.client()
-# get the LLM_API_URL from the environment variables
-LLM_API_URL = os.getenv("LLM_API_URL")
+# Users, applications and jobs live in Firestore, or SQLite with STORAGE_BACKEND=sqlite
+repo = storage.get_repository()
+# Uploaded and generated files live on local disk, or in S3/MinIO with FILE_STORE=s3
+files = file_store.get_file_store()
+# Models per task (extraction, summarization, cover letter, resume), see routing.py
+router = routing.router
 
-# Determine whether to use local LLM or OpenAI model
-USE_OPENAI = os.getenv("USE_OPENAI", "false").lower() == "true"
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-openai.api_key = os.getenv("OPENAI_API_KEY")
-client = openai  # alias for clarity with updated API usage
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await job_queue.start()
+    yield
+    # Stop the job workers, release the pooled LLM and job site connections and stop running extractions
+    await job_queue.stop()
+    await llm_client.close_clients()
+    await scraper.close_client()
+    documents.shutdown_extractions()
 
-app = FastAPI(title="JobSeeker Buddy Backend")
+app = FastAPI(title="JobSeeker Buddy Backend", lifespan=lifespan)
 
-# Directories for file storage
+# Key prefixes for files in the file store
 ASSETS_DIR = "assets"
 APPLICATIONS_DIR = "applications"
-os.makedirs(ASSETS_DIR, exist_ok=True)
-os.makedirs(APPLICATIONS_DIR, exist_ok=True)
+TRACES_DIR = "traces"
 
-# Update any URLs or references to point to the deployed app
-APP_URL = "https://jobseekerbuddy.streamlit.app/"
+async def save_trace(trace: metrics.Trace):
+    """
+    Store a debug trace (stage timings and raw LLM responses) in the file store.
+    """
+    await asyncio.to_thread(
+        files.write_text, f"{TRACES_DIR}/{trace.trace_id}.json", json.dumps(trace.to_dict(), default=str)
+    )
 
-# Use environment variable or default to production URL
-API_BASE_URL = os.getenv('API_BASE_URL')  # Replace with your actual deployed API URL
+# Request metrics and per-stage timings; debug traces are opt-in with DEBUG_TRACES
+app.add_middleware(metrics.MetricsMiddleware, on_debug_trace=save_trace)
 
 # ------------------------------
 # Data Models
@@ -51,6 +72,10 @@ class ApplicationRequest(BaseModel):
     job_link: str
     user_id: str
 
+class BatchApplicationRequest(BaseModel):
+    job_links: list[str]
+    user_id: str
+
 class GenerateRequest(BaseModel):
     application_id: str
     user_id: str
@@ -59,41 +84,39 @@ class FeedbackRequest(BaseModel):
     application_id: str
     user_id: str
     feedback: str
+    # Inferred from the feedback when omitted
+    target: Optional[Literal["cover_letter", "resume", "both"]] = None
 
 # ------------------------------
 # Endpoints
 # ------------------------------
 
-def read_file_content(file_path):
-    if (file_path.lower().endswith('.pdf')):
-        try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                content = ''
-                for page in pdf_reader.pages:
-                    content += page.extract_text()
-                return content
-        except Exception as e:
-            print(f"Error reading PDF file: {e}")
-            return None
-    else:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
-        except Exception as e:
-            print(f"Error reading file: {e}")
-            return None
-
-def parse_document_with_openai(file_path: str) -> str:
+async def parse_document_with_openai(file_path: str, content_hash: str = None) -> str:
     """
-    Parse the document using OpenAI's GPT-4o-mini.
+    Parse the document with the summarization model (GPT-4o-mini by default).
+    Results are cached by the SHA-256 of the file bytes, so re-uploading
+    the same document skips both text extraction and the LLM call.
     """
-    content = read_file_content(file_path)
+    route = router.routes["summarization"][0]
+    cache_key = f"{route.model or route.backend}-{content_hash or cache.hash_file(file_path)}"
+    cached = cache.parsed_documents.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    with metrics.stage("text_extraction"):
+        content = await documents.extract_text(file_path)
     if content is None:
         return "Error: Could not read the file."
     
-    prompt = f"Extract and summarize the key information from the following document:\n\n{content}"
-    return call_openai_model(prompt, model="gpt-4o-mini")
+    prompt = prompts.build_prompt(
+        "Extract and summarize the key information from the following document:\n\n{content}",
+        router.budget_key("summarization"),
+        name="parse_document",
+        content=content
+    )
+    parsed = await router.complete("summarization", prompt)
+    cache.parsed_documents.set(cache_key, parsed)
+    return parsed
 
 # 1. Upload Main Assets (Resume, LinkedIn PDF, Experience Details)
 @app.post("/upload_assets")
@@ -103,274 +126,674 @@ async def upload_assets(
     linkedin: UploadFile = File(...),
     experience: UploadFile = File(...)
 ):
-    user_folder = os.path.join(ASSETS_DIR, user_id)
-    os.makedirs(user_folder, exist_ok=True)
-    
-    # Save files locally
-    resume_path = os.path.join(user_folder, f"resume_{resume.filename}")
-    linkedin_path = os.path.join(user_folder, f"linkedin_{linkedin.filename}")
-    experience_path = os.path.join(user_folder, f"experience_{experience.filename}")
+    uploads = {"resume": resume, "linkedin": linkedin, "experience": experience}
+    # Keys in the file store; only the base name of the uploaded file is kept
+    keys = {
+        name: f"{ASSETS_DIR}/{user_id}/{name}_{os.path.basename(upload.filename or name)}"
+        for name, upload in uploads.items()
+    }
     
-    with open(resume_path, "wb") as f:
-        f.write(await resume.read())
-    with open(linkedin_path, "wb") as f:
-        f.write(await linkedin.read())
-    with open(experience_path, "wb") as f:
-        f.write(await experience.read())
+    # Save files to a scratch directory for parsing, then hand them to the file store
+    upload_dir = tempfile.mkdtemp(prefix="upload_")
+    try:
+        local_paths = {name: os.path.join(upload_dir, os.path.basename(key)) for name, key in keys.items()}
+        try:
+            hashes = await asyncio.gather(*(
+                documents.save_upload(uploads[name], local_paths[name]) for name in uploads
+            ))
+        except documents.UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        
+        # Parse documents using OpenAI; extraction and summarization run concurrently
+        parsed_resume, parsed_linkedin, parsed_experience = await asyncio.gather(*(
+            parse_document_with_openai(local_paths[name], content_hash)
+            for name, content_hash in zip(uploads, hashes)
+        ))
+        
+        await asyncio.gather(*(
+            asyncio.to_thread(files.put_file, keys[name], local_paths[name]) for name in uploads
+        ))
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
     
-    # Parse documents using OpenAI
-    parsed_resume = parse_document_with_openai(resume_path)
-    parsed_linkedin = parse_document_with_openai(linkedin_path)
-    parsed_experience = parse_document_with_openai(experience_path)
+    # Build the experience ranking index now rather than on the first generation
+    await asyncio.to_thread(ranking.get_index, {
+        "parsed_resume": parsed_resume,
+        "parsed_linkedin": parsed_linkedin,
+        "parsed_experience": parsed_experience,
+    })
     
-    # Store file references and parsed content in Firestore under the "users" collection
-    user_ref = db.collection("users").document(user_id)
-    user_ref.set({
-        "resume": resume_path,
-        "linkedin": linkedin_path,
-        "experience": experience_path,
+    # Store file references and parsed content under the "users" collection
+    await asyncio.to_thread(repo.set_user, user_id, {
+        "resume": keys["resume"],
+        "linkedin": keys["linkedin"],
+        "experience": keys["experience"],
         "parsed_resume": parsed_resume,
         "parsed_linkedin": parsed_linkedin,
         "parsed_experience": parsed_experience,
-    }, merge=True)
+    })
     
     return {"message": "Assets uploaded and parsed successfully", "user_id": user_id}
 
-# 2. Create New Application Folder with Job Scraping via Tavily
-def scrape_job_posting(job_link: str):
-    """
-    Scrape job posting details directly within the FastAPI application.
-    """
+async def fetch_job_page(job_link: str, use_api: bool = True) -> dict:
     try:
-        resp = requests.get(job_link)
-        resp.raise_for_status()  # Raise an HTTPError for bad responses
-        html = resp.text
-        soup = BeautifulSoup(html, 'html.parser')
-        text = soup.get_text(separator="\n")
-        job_info = extract_job_info_from_text(text)
-        return job_info
-    except requests.exceptions.RequestException as e:
+        # Pooled, size-capped fetch, revalidated against the stored copy of the page
+        with metrics.stage("scrape"):
+            return await scraper.fetch_job_page(job_link, use_api)
+    except scraper.ScrapeError as e:
         # Log the error details
         print(f"Error scraping job posting: {e}")
-        raise HTTPException(status_code=500, detail=f"Error scraping job posting: {e}")
+        raise HTTPException(status_code=e.status_code, detail=f"Error scraping job posting: {e}")
 
-@app.post("/new_application")
-async def new_application(app_request: ApplicationRequest):
-    user_id = app_request.user_id
-    job_link = app_request.job_link
+# 2. Create New Application Folder with Job Scraping via Tavily
+async def scrape_job_posting(job_link: str):
+    """
+    Scrape job posting details directly within the FastAPI application.
+    """
+    fetched = await fetch_job_page(job_link)
+    if fetched["posting"]:
+        # Greenhouse and Lever postings come from their JSON API: no LLM call needed
+        details = job_schema.JobDetails.model_validate(job_text.job_details_from_posting(fetched["posting"]))
+        if details.is_complete():
+            return details.to_dict()
+        print(f"Job board API posting for {job_link} is incomplete, extracting from the page")
+        fetched = await fetch_job_page(job_link, use_api=False)
     
-    # Scrape job details using Tavily integration
-    job_details = scrape_job_posting(job_link)
+    # Strip boilerplate before anything reaches the LLM
+    with metrics.stage("html_parse"):
+        page = await asyncio.to_thread(job_text.preprocess_job_page, fetched["text"])
+    print(
+        f"Job page {job_link}: {page['raw_tokens']} -> {page['clean_tokens']} tokens "
+        f"({page['reduction']:.0%} reduction, source: {page['source']}"
+        f"{', not modified' if fetched['not_modified'] else ''})"
+    )
+    if page["job_details"]:
+        # Complete JobPosting structured data: no LLM call needed
+        return page["job_details"]
+    text = page["text"]
     
-    # Create a unique application folder
+    # Same posting with unchanged content: reuse the previous extraction
+    cache_key = cache.hash_text(f"{cache.normalize_url(job_link)}\n{cache.hash_text(text)}")
+    job_info = cache.job_extractions.get(cache_key)
+    if job_info is not None:
+        return job_info
+    
+    with metrics.stage("job_extraction"):
+        job_info = await extract_job_info_from_text(text)
+    if "error" not in job_info:
+        cache.job_extractions.set(cache_key, job_info)
+    return job_info
+
+async def build_application(user_id: str, job_link: str, job_details: dict):
+    """
+    Create the application folder in the file store and return its id and
+    application document.
+    """
     application_id = str(uuid.uuid4())
-    application_folder = os.path.join(APPLICATIONS_DIR, application_id)
-    os.makedirs(application_folder, exist_ok=True)
+    application_folder = f"{APPLICATIONS_DIR}/{application_id}"
     
-    # Save job details locally for reference
-    job_details_path = os.path.join(application_folder, "job_details.json")
-    with open(job_details_path, "w") as f:
-        json.dump(job_details, f)
+    # Save job details in the file store for reference
+    await asyncio.to_thread(files.write_text, f"{application_folder}/job_details.json", json.dumps(job_details))
     
-    # Create a document in Firestore for the new application
+    # Document to store for the new application
     app_doc = {
         "user_id": user_id,
         "job_link": job_link,
         "job_details": job_details,
         "application_folder": application_folder,
-        "versions": []
+        # Versions live in their own collection; only the latest of each document is referenced here
+        "version_count": 0,
+        "latest": {}
     }
-    db.collection("applications").document(application_id).set(app_doc)
+    return application_id, app_doc
+
+@app.post("/new_application")
+async def new_application(app_request: ApplicationRequest):
+    user_id = app_request.user_id
+    job_link = app_request.job_link
+    
+    # Scrape job details using Tavily integration
+    job_details = await scrape_job_posting(job_link)
+    
+    # Create a document for the new application
+    application_id, app_doc = await build_application(user_id, job_link, job_details)
+    await asyncio.to_thread(repo.create_application, application_id, app_doc)
     
     return {"message": "Application created", "application_id": application_id, "job_details": job_details}
 
-# 3. LLM Integration Functions (Simulated local calls)
-def call_reasoning_model(prompt: str):
+async def process_batch_link(user_id: str, job_link: str):
     """
-    Call the reasoning model.
-    This example uses a streaming response.
+    Scrape and extract one posting of a batch import.
     """
-    if (USE_OPENAI):
-        return call_openai_model(prompt, model="o1-mini")
-    else:
-        return call_local_model(prompt)
+    job_details = await scrape_job_posting(job_link)
+    if "error" in job_details:
+        raise ValueError(f"{job_details['error']}: {job_details.get('details')}")
+    return await build_application(user_id, job_link, job_details)
 
-def call_local_model(prompt: str):
+@app.post("/new_applications/batch")
+async def new_applications_batch(batch_request: BatchApplicationRequest):
     """
-    Call the local LMStudio reasoning model.
+    Import many job links at once. Returns a batch id to poll for progress.
     """
-    reasoning_url = LLM_API_URL + "/v1/completions"
-    payload = {"prompt": prompt, "stream": False, "max_tokens": 50000}
-    response = requests.post(reasoning_url, json=payload, stream=False)
-    response_data = response.json()
-    with open("debug/reasoning_response.json", "w") as f:
-        json.dump(response_data, f)
-    return response_data.get("choices", [{}])[0].get("text", "")
+    # Drop duplicate links (after normalization) while keeping the submitted order
+    job_links = []
+    seen = set()
+    for link in batch_request.job_links:
+        key = cache.normalize_url(link)
+        if link.strip() and key not in seen:
+            seen.add(key)
+            job_links.append(link.strip())
+    if not job_links:
+        raise HTTPException(status_code=400, detail="No job links provided")
+    if len(job_links) > batch.BATCH_MAX_LINKS:
+        raise HTTPException(status_code=400, detail=f"At most {batch.BATCH_MAX_LINKS} job links per batch")
+    
+    batch_id = await batch.scheduler.submit(batch_request.user_id, job_links, process_batch_link, repo.create_applications)
+    return {"message": "Batch submitted", "batch_id": batch_id, "total": len(job_links)}
+
+@app.get("/new_applications/batch/{batch_id}")
+async def get_applications_batch(batch_id: str):
+    status = await batch.scheduler.get(batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return status
 
-def call_openai_model(prompt: str, model: str = "gpt-4o-mini"):
+# 3. LLM Integration Functions
+async def timed_generation(task: str, prompt: str) -> dict:
     """
-    Call the OpenAI model.
+    Run one generation on the model routed for `task` and record how long it took.
+    Failures are captured in the result instead of raised so that a
+    sibling generation can still succeed.
     """
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": model,
-        "messages": [{"role": "user", "content": prompt}]
-        # "max_completion_tokens": 50000,
+    start = time.perf_counter()
+    try:
+        content = await router.complete(task, prompt)
+        error = None
+    except Exception as e:
+        print(f"Error generating document: {e}")
+        content = None
+        error = {
+            "detail": str(e),
+            "retryable": getattr(e, "retryable", True),
+        }
+    return {
+        "content": content,
+        "error": error,
+        "seconds": round(time.perf_counter() - start, 3),
     }
-    response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-    with open("debug/openai_response.json", "w") as f:
-        json.dump(response.json(), f)
-    response_data = response.json()
-    content = response_data["choices"][0]["message"]["content"]    
-    return content
 
-def call_chat_model(messages: list):
+async def generate_document_pair(built_prompts: dict) -> dict:
     """
-    Call the local LMStudio chat model.
+    Generate several documents concurrently, keyed like `built_prompts`.
+    Raises a 502 only if every generation failed.
     """
-    chat_url = LLM_API_URL+"/v1/chat/completions"
-    payload = {"messages": messages, "stream": True}
-    response = requests.post(chat_url, json=payload, stream=True)
-    response_data = response.json()
-    return response_data["choices"][0]["text"]
+    names = list(built_prompts)
+    results = await asyncio.gather(*(timed_generation(name, built_prompts[name]) for name in names))
+    results = dict(zip(names, results))
+    if all(result["error"] for result in results.values()):
+        raise HTTPException(
+            status_code=502,
+            detail={name: result["error"] for name, result in results.items()}
+        )
+    return results
+
+def generation_response(message: str, results: dict, texts: dict) -> dict:
+    """
+    Build the API response for a (possibly partial) generation.
+    """
+    errors = {name: result["error"] for name, result in results.items() if result["error"]}
+    response = {
+        "message": message if not errors else f"{message} (partially)",
+        **texts,
+        "timings": {name: result["seconds"] for name, result in results.items()},
+    }
+    if errors:
+        response["errors"] = errors
+    return response
 
 # 4. Generate Documents (Cover Letter & Customized Resume)
-@app.post("/generate_documents")
-async def generate_documents(gen_request: GenerateRequest):
-    application_id = gen_request.application_id
-    user_id = gen_request.user_id
-    
-    # Retrieve user asset references from Firestore
-    user_ref = db.collection("users").document(user_id)
-    user_data = user_ref.get().to_dict()
+async def load_generation_context(application_id: str, user_id: str):
+    """
+    Fetch the application and user documents needed to generate documents,
+    both in a single round trip.
+    """
+    user_data, app_data = await asyncio.to_thread(repo.get_user_and_application, user_id, application_id)
     if not user_data:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    # Retrieve application data from Firestore
-    app_ref = db.collection("applications").document(application_id)
-    app_data = app_ref.get().to_dict()
     if not app_data:
         raise HTTPException(status_code=404, detail="Application not found")
     
-    job_details = app_data.get("job_details", {})
-    
-    # Build prompts for cover letter and resume customization using parsed and raw text
-    cover_letter_prompt = (
-        f"Generate a cover letter based on the following job details: {job_details} "
-        f"and the user's experience from parsed resume: {user_data.get('parsed_resume')} "
-        f"and parsed LinkedIn profile: {user_data.get('parsed_linkedin')}."
-    )
-    resume_prompt = (
-        f"Modify the resume to highlight the most relevant experiences for the job described as: {job_details}. "
-        f"Use the parsed resume: {user_data.get('parsed_resume')} and parsed LinkedIn profile: {user_data.get('parsed_linkedin')}. "
-        "Do not fabricate any information."
-    )
+    return app_data, user_data
+
+GENERATION_TEMPLATES = {
+    "cover_letter": (
+        "Generate a cover letter based on the following job details: {job_details} "
+        "and the user's experience from parsed resume: {parsed_resume} "
+        "and parsed LinkedIn profile: {parsed_linkedin}.{extra}"
+    ),
+    "resume": (
+        "Modify the resume to highlight the most relevant experiences for the job described as: {job_details}. "
+        "Use the following excerpts of the user's resume, LinkedIn profile and experience details, "
+        "selected as the most relevant to this job:\n{relevant_experience}\n"
+        "Do not fabricate any information.{extra}"
+    ),
+}
+
+REVISION_TEMPLATE = (
+    "Revise the {label} below according to this feedback: '{feedback}'.\n"
+    "It is for the position: {role}.\n"
+    "Only change what the feedback asks for, keep everything else as is, do not fabricate "
+    "any information, and return the complete revised {label} with no commentary.\n\n"
+    "Current {label}:\n{previous}"
+)
+
+def generation_prompts(job_details: dict, user_data: dict, names: list = None, extra: str = "") -> dict:
+    """
+    Build prompts for cover letter and resume customization, with job details
+    as compact JSON and the parsed profiles trimmed to the model's budget.
+    The resume prompt only gets the experience ranked most relevant to the job.
+    Blocking (ranking and token counting), so callers run it in a thread.
+    """
+    names = names or list(GENERATION_TEMPLATES)
+    sections = {
+        "job_details": job_details,
+        "parsed_resume": user_data.get("parsed_resume"),
+        "parsed_linkedin": user_data.get("parsed_linkedin"),
+    }
+    if "resume" in names:
+        sections["relevant_experience"] = ranking.relevant_experience(user_data, job_details)
+    built = {}
+    for name in names:
+        # Only pass the sections the template uses, so unused ones do not take up budget
+        used = {key: value for key, value in sections.items() if f"{{{key}}}" in GENERATION_TEMPLATES[name]}
+        built[name] = prompts.build_prompt(
+            GENERATION_TEMPLATES[name],
+            router.budget_key(name),
+            name=name,
+            keep=("extra",),
+            extra=extra,
+            **used
+        )
+    return built
+
+DOCUMENT_LABELS = {"cover_letter": "cover letter", "resume": "resume"}
+
+def feedback_targets(feedback_text: str, target: str = None) -> list:
+    """
+    Decide which documents a feedback round should regenerate.
+    Without an explicit target, a feedback that only mentions one of the
+    documents regenerates just that one.
+    """
+    if target and target != "both":
+        if target not in DOCUMENT_LABELS:
+            raise HTTPException(status_code=400, detail=f"Unknown feedback target: {target}")
+        return [target]
+    if target == "both":
+        return list(DOCUMENT_LABELS)
+    text = feedback_text.lower()
+    mentions_letter = "letter" in text
+    mentions_resume = bool(re.search(r"\br[ée]sum[ée]\b|\bcv\b", text))
+    if mentions_letter and not mentions_resume:
+        return ["cover_letter"]
+    if mentions_resume and not mentions_letter:
+        return ["resume"]
+    return list(DOCUMENT_LABELS)
+
+def read_version_text(application_id: str, records: dict, number: int, name: str):
+    """
+    Text of document `name` as of version `number`, rebuilt from its deltas.
+    Blocking; `records` holds the version records already loaded.
+    """
+    get_record = lambda n: repo.get_version(application_id, n)
+    return versions.document_text(records, get_record, files.read_text, number, name)
+
+def version_state(app_data: dict):
+    """
+    The application's `latest` pointers, and for applications whose history
+    is still a legacy `versions` array (moved to the versions collection on
+    their next version), all their version records by number.
+    """
+    if "version_count" in app_data:
+        return app_data.get("latest") or {}, None
+    records, latest = storage.legacy_versions(app_data)
+    return latest, {record["number"]: record for record in records}
+
+async def latest_documents(application_id: str, app_data: dict) -> dict:
+    """
+    Text of the most recent version of each document, None for documents
+    not generated yet.
+    """
+    latest, records = version_state(app_data)
+    # One query covers the delta chains back to the last snapshots in the usual case
+    newest = max((pointer["version"] for pointer in latest.values()), default=0)
+    if records is None:
+        records = {}
+        if newest:
+            page = await asyncio.to_thread(
+                repo.list_versions, application_id, 2 * versions.VERSION_SNAPSHOT_INTERVAL, newest + 1
+            )
+            records = {record["number"]: record for record in page}
     
-    # Generate cover letter by streaming reasoning steps from the LLM
-    cover_letter_content = call_reasoning_model(cover_letter_prompt)
+    def load(name: str):
+        if name not in latest:
+            return None
+        return read_version_text(application_id, records, latest[name]["version"], name)
     
-    # Generate customized resume similarly
-    resume_content = call_reasoning_model(resume_prompt)
+    async def read(name: str):
+        try:
+            return await asyncio.to_thread(load, name)
+        except Exception as e:
+            print(f"Error reading previous document: {e}")
+            return None
     
-    # Save generated documents in the application folder
+    contents = await asyncio.gather(*(read(name) for name in DOCUMENT_LABELS))
+    return dict(zip(DOCUMENT_LABELS, contents))
+
+def feedback_prompts(job_details: dict, user_data: dict, feedback_text: str, previous: dict, targets: list) -> dict:
+    """
+    Build revision prompts for the targeted documents. When a previous
+    version exists the prompt only carries that document and the feedback;
+    otherwise it falls back to a full generation prompt with the feedback.
+    Blocking, like generation_prompts.
+    """
+    role = " at ".join(part for part in (job_details.get("role"), job_details.get("company")) if part)
+    revisions = [name for name in targets if previous.get(name)]
+    # Documents without a previous version get a full generation prompt
+    built = generation_prompts(
+        job_details,
+        user_data,
+        names=[name for name in targets if name not in revisions],
+        extra=f" Also take into account this feedback: '{feedback_text}'."
+    ) if len(revisions) < len(targets) else {}
+    for name in revisions:
+        built[name] = prompts.build_prompt(
+            REVISION_TEMPLATE,
+            router.budget_key(name),
+            name=f"{name}_revision",
+            keep=("label", "feedback", "role", "previous"),
+            label=DOCUMENT_LABELS[name],
+            feedback=feedback_text,
+            role=role or "the target job",
+            previous=previous[name]
+        )
+    return built
+
+async def prepare_feedback(application_id: str, user_id: str, feedback_text: str, target: str = None):
+    """
+    Load what a feedback round needs: the prompts for the targeted documents,
+    the previous documents and the names of the untouched ones.
+    """
+    app_data, user_data = await load_generation_context(application_id, user_id)
+    targets = feedback_targets(feedback_text, target)
+    previous = await latest_documents(application_id, app_data)
+    built_prompts = await asyncio.to_thread(
+        feedback_prompts, app_data.get("job_details", {}), user_data, feedback_text, previous, targets
+    )
+    carried = [name for name in previous if name not in targets]
+    return app_data, built_prompts, previous, carried
+
+async def save_version(application_id: str, app_data: dict, generated: dict, feedback_text: str = None,
+                       previous: dict = None) -> dict:
+    """
+    Record the generated documents as the application's next version.
+    Documents that failed to generate (None) are skipped. A document
+    revised from `previous` is stored as a delta against it when that is
+    worthwhile, otherwise its full text is written to the application
+    folder of the file store under a unique name.
+    """
     application_folder = app_data["application_folder"]
-    cover_letter_path = os.path.join(application_folder, "cover_letter.txt")
-    resume_path = os.path.join(application_folder, "custom_resume.txt")
-    with open(cover_letter_path, "w") as f:
-        f.write(cover_letter_content)
-    with open(resume_path, "w") as f:
-        f.write(resume_content)
+    filenames = {"cover_letter": "cover_letter", "resume": "custom_resume"}
+    latest, _ = version_state(app_data)
+    entries, pointers = {}, {}
+    for name, content in generated.items():
+        if content is None:
+            continue
+        base = latest.get(name)
+        delta = versions.encode(content, (previous or {}).get(name), base)
+        if delta is not None:
+            entries[name] = {"base": base["version"], "delta": delta}
+            pointers[name] = {"depth": base.get("depth", 0) + 1}
+        else:
+            entries[name] = {"path": f"{application_folder}/{filenames[name]}_{uuid.uuid4().hex}.txt"}
+            pointers[name] = {"depth": 0}
+            await asyncio.to_thread(files.write_text, entries[name]["path"], content)
     
-    # Record this version in Firestore
-    version_entry = {
-        "cover_letter": cover_letter_path,
-        "resume": resume_path,
-        "feedback": None
-    }
-    app_ref.update({
-        "versions": firestore.ArrayUnion([version_entry])
-    })
+    # Record this version in the application's history
+    version_entry = {"feedback": feedback_text, "created": time.time(), "documents": entries}
+    version_entry["number"] = await asyncio.to_thread(repo.add_version, application_id, version_entry, pointers)
+    return version_entry
+
+async def run_generation(application_id: str, user_id: str) -> dict:
+    """
+    Generate the cover letter and resume for an application and record the version.
+    """
+    app_data, user_data = await load_generation_context(application_id, user_id)
+    built_prompts = await asyncio.to_thread(generation_prompts, app_data.get("job_details", {}), user_data)
     
-    return {
-        "message": "Documents generated",
-        "cover_letter": cover_letter_content,
-        "resume": resume_content
-    }
+    # Generate the cover letter and customized resume concurrently
+    results = await generate_document_pair(built_prompts)
+    generated = {name: result["content"] for name, result in results.items()}
+    await save_version(application_id, app_data, generated)
+    
+    return generation_response("Documents generated", results, generated)
 
 # 5. Process User Feedback and Regenerate Documents
-@app.post("/feedback")
-async def process_feedback(feedback_request: FeedbackRequest):
-    application_id = feedback_request.application_id
-    user_id = feedback_request.user_id
-    feedback_text = feedback_request.feedback
+async def run_feedback(application_id: str, user_id: str, feedback_text: str, target: str = None) -> dict:
+    """
+    Revise the documents targeted by the user's feedback, starting from
+    their latest versions.
+    """
+    app_data, built_prompts, previous, _ = await prepare_feedback(application_id, user_id, feedback_text, target)
     
-    # Fetch application data
-    app_ref = db.collection("applications").document(application_id)
-    app_data = app_ref.get().to_dict()
-    if not app_data:
-        raise HTTPException(status_code=404, detail="Application not found")
+    # Regenerate the targeted documents concurrently
+    results = await generate_document_pair(built_prompts)
+    generated = {name: result["content"] for name, result in results.items()}
+    await save_version(application_id, app_data, generated, feedback_text, previous)
     
-    # Retrieve user data
-    user_ref = db.collection("users").document(user_id)
-    user_data = user_ref.get().to_dict()
+    response = generation_response("Documents regenerated with feedback", results, {**previous, **generated})
+    response["regenerated"] = list(built_prompts)
+    return response
+
+# Streaming: relay tokens to the client as server-sent events
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_documents(application_id: str, app_data: dict, built_prompts: dict, message: str, feedback_text: str = None,
+                           previous: dict = None, unchanged: dict = None):
+    """
+    Stream every document of `built_prompts` concurrently, interleaving their tokens.
+    Emits an `unchanged` event for each document that is not regenerated,
+    `token` events as text arrives, a `done` or `error` event per
+    document, and a final `complete` event once the version is saved.
+    """
+    for name, text in (unchanged or {}).items():
+        if text is not None:
+            yield sse_event("unchanged", {"document": name, "text": text})
+    events = asyncio.Queue()
     
-    job_details = app_data.get("job_details", {})
+    async def produce(name: str, prompt: str):
+        start = time.perf_counter()
+        chunks = []
+        try:
+            async for text in router.stream(name, prompt):
+                chunks.append(text)
+                await events.put(("token", {"document": name, "text": text}))
+            content = "".join(chunks)
+            error = None
+        except Exception as e:
+            print(f"Error streaming document: {e}")
+            content = None
+            error = {"detail": str(e), "retryable": getattr(e, "retryable", True)}
+        result = {"content": content, "error": error, "seconds": round(time.perf_counter() - start, 3)}
+        if error:
+            await events.put(("error", {"document": name, **error}))
+        else:
+            await events.put(("done", {"document": name, "seconds": result["seconds"]}))
+        return result
     
-    # Build new prompts that include the user feedback using parsed and raw text
-    cover_letter_prompt = (
-        f"Based on the previous cover letter and the following feedback: '{feedback_text}', "
-        f"regenerate the cover letter for the job described as: {job_details}. "
-        f"Use parsed resume: {user_data.get('parsed_resume')} and parsed LinkedIn profile: {user_data.get('parsed_linkedin')}."
+    tasks = {name: asyncio.create_task(produce(name, prompt)) for name, prompt in built_prompts.items()}
+    try:
+        remaining = len(tasks)
+        while remaining:
+            event, data = await events.get()
+            if event in ("done", "error"):
+                remaining -= 1
+            yield sse_event(event, data)
+        
+        results = {name: task.result() for name, task in tasks.items()}
+        if all(result["error"] for result in results.values()):
+            yield sse_event("complete", {"message": "Document generation failed", "errors": {
+                name: result["error"] for name, result in results.items()
+            }})
+            return
+        generated = {name: result["content"] for name, result in results.items()}
+        await save_version(application_id, app_data, generated, feedback_text, previous)
+        response = generation_response(message, results, generated)
+        # The documents were already streamed; only send the summary
+        for name in generated:
+            response.pop(name, None)
+        response["regenerated"] = list(built_prompts)
+        yield sse_event("complete", response)
+    finally:
+        # Client disconnected or generation finished: stop any running streams
+        for task in tasks.values():
+            task.cancel()
+
+@app.post("/generate_documents/stream")
+async def generate_documents_stream(gen_request: GenerateRequest):
+    app_data, user_data = await load_generation_context(gen_request.application_id, gen_request.user_id)
+    built_prompts = await asyncio.to_thread(generation_prompts, app_data.get("job_details", {}), user_data)
+    return StreamingResponse(
+        stream_documents(gen_request.application_id, app_data, built_prompts, "Documents generated"),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    resume_prompt = (
-        f"Based on the previous resume and feedback: '{feedback_text}', "
-        f"regenerate the resume to better highlight relevant experiences for the job: {job_details}. "
-        f"Use parsed resume: {user_data.get('parsed_resume')} and parsed LinkedIn profile: {user_data.get('parsed_linkedin')}."
+
+@app.post("/feedback/stream")
+async def process_feedback_stream(feedback_request: FeedbackRequest):
+    app_data, built_prompts, previous, carried = await prepare_feedback(
+        feedback_request.application_id,
+        feedback_request.user_id,
+        feedback_request.feedback,
+        feedback_request.target
     )
+    return StreamingResponse(
+        stream_documents(
+            feedback_request.application_id, app_data, built_prompts, "Documents regenerated with feedback", feedback_request.feedback,
+            previous, {name: previous[name] for name in carried}
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Synchronous endpoints: the connection stays open until both documents are ready
+@app.post("/generate_documents")
+async def generate_documents(gen_request: GenerateRequest):
+    return await run_generation(gen_request.application_id, gen_request.user_id)
+
+@app.post("/feedback")
+async def process_feedback(feedback_request: FeedbackRequest):
+    return await run_feedback(
+        feedback_request.application_id,
+        feedback_request.user_id,
+        feedback_request.feedback,
+        feedback_request.target
+    )
+
+# Version history, newest first, paginated with the `next_before` of the previous page
+VERSIONS_PAGE_SIZE = int(os.getenv("VERSIONS_PAGE_SIZE", "20"))
+
+@app.get("/applications/{application_id}/versions")
+async def get_application_versions(
+    application_id: str,
+    limit: int = Query(VERSIONS_PAGE_SIZE, ge=1, le=100),
+    before: Optional[int] = Query(None, ge=1),
+    include_text: bool = False
+):
+    app_data = await asyncio.to_thread(repo.get_application, application_id)
+    if not app_data:
+        raise HTTPException(status_code=404, detail="Application not found")
+    _, legacy = version_state(app_data)
+    if legacy is None:
+        page = await asyncio.to_thread(repo.list_versions, application_id, limit, before)
+        version_count = app_data["version_count"]
+    else:
+        # Not moved to the versions collection yet
+        page = [legacy[number] for number in sorted(legacy, reverse=True) if before is None or number < before][:limit]
+        version_count = len(legacy)
     
-    # Regenerate cover letter
-    new_cover_letter = call_reasoning_model(cover_letter_prompt)
-    
-    # Regenerate resume
-    new_resume = call_reasoning_model(resume_prompt)
-    
-    # Save new versions with unique filenames
-    application_folder = app_data["application_folder"]
-    cover_letter_path = os.path.join(application_folder, f"cover_letter_{uuid.uuid4().hex}.txt")
-    resume_path = os.path.join(application_folder, f"custom_resume_{uuid.uuid4().hex}.txt")
-    with open(cover_letter_path, "w") as f:
-        f.write(new_cover_letter)
-    with open(resume_path, "w") as f:
-        f.write(new_resume)
-    
-    # Update version history in Firestore
-    version_entry = {
-        "cover_letter": cover_letter_path,
-        "resume": resume_path,
-        "feedback": feedback_text
-    }
-    app_ref.update({
-        "versions": firestore.ArrayUnion([version_entry])
-    })
-    
+    records = {record["number"]: record for record in page}
+    items = []
+    for record in page:
+        item = {
+            "number": record["number"],
+            "feedback": record.get("feedback"),
+            "created": record.get("created"),
+            "documents": sorted(record.get("documents", {})),
+        }
+        if include_text:
+            item["text"] = {
+                name: await asyncio.to_thread(read_version_text, application_id, records, record["number"], name)
+                for name in item["documents"]
+            }
+        items.append(item)
+    last = page[-1]["number"] if page else None
     return {
-        "message": "Documents regenerated with feedback",
-        "cover_letter": new_cover_letter,
-        "resume": new_resume
+        "application_id": application_id,
+        "version_count": version_count,
+        "versions": items,
+        "next_before": last if len(page) == limit and last > 1 else None,
     }
 
+# Background generation jobs: submit, then poll /jobs/{job_id}
+job_queue = jobs.JobQueue(persist=repo.save_job, load=repo.get_job)
+# Batch progress is stored so any worker can report it
+batch.scheduler.persist = repo.save_batch
+batch.scheduler.load = repo.get_batch
+job_queue.register("generate_documents", run_generation)
+job_queue.register("feedback", run_feedback)
+
+async def submit_job(kind: str, params: dict) -> dict:
+    try:
+        job = await job_queue.submit(kind, params)
+    except jobs.QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"message": "Job submitted", "job_id": job["job_id"], "status": job["status"]}
+
+@app.post("/jobs/generate_documents", status_code=202)
+async def submit_generate_documents(gen_request: GenerateRequest):
+    return await submit_job("generate_documents", {
+        "application_id": gen_request.application_id,
+        "user_id": gen_request.user_id,
+    })
+
+@app.post("/jobs/feedback", status_code=202)
+async def submit_feedback(feedback_request: FeedbackRequest):
+    return await submit_job("feedback", {
+        "application_id": feedback_request.application_id,
+        "user_id": feedback_request.user_id,
+        "feedback_text": feedback_request.feedback,
+        "target": feedback_request.target,
+    })
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 # 6. Retrieve User Assets
 @app.get("/user_assets/{user_id}")
 async def get_user_assets(user_id: str):
-    try:
-        response = requests.get(f"{API_BASE_URL}/user_assets/{user_id}")
-        return response.json()
-    except requests.exceptions.ConnectionError:
-        st.error("Unable to connect to the server. Please check your internet connection or try again later.")
-        return None
+    user_data = await asyncio.to_thread(repo.get_user, user_id)
+    if not user_data:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {
+        "resume": user_data.get("resume"),
+        "linkedin": user_data.get("linkedin"),
+        "experience": user_data.get("experience"),
+    }
 
 # New: Convert the Flask extraction endpoint to FastAPI
 @app.get("/extract")
@@ -379,29 +802,58 @@ async def extract(url: str = Query(...)):
     FastAPI endpoint for extracting job posting details.
     """
     try:
-        job_info = scrape_job_posting(url)
+        job_info = await scrape_job_posting(url)
         return job_info
     except Exception as e:
         return {"error": str(e)}
 
-# Helper function to clean up the JSON output from the model
-def clean_json_output(text):
+@app.get("/extract/stats")
+async def extract_stats():
+    """
+    Pages preprocessed, how many had JobPosting data and the overall token reduction.
+    """
+    return job_text.summary()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Request, stage and LLM metrics of this worker in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    if metrics.DEBUG_TRACES == "off":
+        raise HTTPException(status_code=404, detail="Debug traces are disabled")
+    if not re.fullmatch(r"[0-9a-f]{32}", trace_id):
+        raise HTTPException(status_code=404, detail="Trace not found")
+    content = await asyncio.to_thread(files.read_text, f"{TRACES_DIR}/{trace_id}.json")
+    if content is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return json.loads(content)
+
+@app.get("/llm/stats")
+async def llm_stats():
     """
-    Attempt to clean up the output from the model.
-    This example uses a simple regex to remove extraneous text before and after the JSON.
+    Model per task and the load and average latency of each LLM backend in this worker.
     """
-    # Find the first occurrence of a JSON object in the string.
-    match = re.search(r'\{.*\}', text, re.DOTALL)
-    if match:
-        return match.group(0)
-    return text
+    return router.stats()
 
-def extract_job_info_from_text(text):
+@app.get("/cache/stats")
+async def cache_stats():
     """
-    Uses the OpenAI API (GPT-4o) to extract standard job posting fields
-    from the given text, with strong instructions to output valid JSON.
+    Hit/miss counters and sizes for the document and job extraction caches
+    and the in-memory user/application cache.
     """
-    prompt = f"""
+    stats = cache.all_stats()
+    if isinstance(repo, storage.CachedRepository):
+        stats["documents"] = repo.cache_stats()
+    return stats
+
+# Job pages up to this many tokens go to the smaller extraction model first
+EASY_PAGE_MAX_TOKENS = int(os.getenv("EASY_PAGE_MAX_TOKENS", "1500"))
+
+JOB_EXTRACTION_TEMPLATE = """
 You are an expert job posting parser. Given the following job posting text, extract and map the information into the following fields:
 - company
 - role
@@ -426,29 +878,83 @@ If any field is missing from the job posting, use an empty string (or an empty l
 Job posting text:
 {text}
     """
+
+JOB_REPAIR_TEMPLATE = """
+The following output was meant to be a JSON object with the fields {fields}, but it could not be parsed ({error}).
+Return the corrected JSON object only, keeping the information as is.
+
+Output:
+{output}
+    """
+
+JOB_EXTRACTION_SYSTEM = "You are a helpful assistant specialized in parsing job postings."
+
+async def complete_job_details(task: str, prompt: str) -> str:
+    """
+    Call the model routed for `task` in structured output mode, or in
+    plain JSON-in-text mode if the backend rejects the response format.
+    """
     try:
-        # Call the OpenAI API using the updated API method with GPT-4o
-        completion = client.chat.completions.create(
-            model="gpt-4o",  # Specify the GPT-4 optimized model
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant specialized in parsing job postings."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        # Retrieve the response from the model
-        result = completion.choices[0].message.content
-        
-        # Clean the output to isolate the JSON if extraneous text is present
-        cleaned_result = clean_json_output(result)
-        
-        parsed = json.loads(cleaned_result)
-        return parsed
-    except Exception as e:
-        return {"error": "Extraction failed", "details": str(e)}
+        return await router.complete(task, prompt, system=JOB_EXTRACTION_SYSTEM,
+                                     response_format=job_schema.RESPONSE_FORMAT)
+    except llm_client.LLMError as e:
+        if e.status_code != 400:
+            raise
+        print(f"Structured output rejected for {task}, retrying without it: {e}")
+        return await router.complete(task, prompt, system=JOB_EXTRACTION_SYSTEM)
 
-if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+async def parse_job_details(output: str) -> job_schema.JobDetails:
+    """
+    Validate an extraction response. Near-valid JSON is repaired locally;
+    anything else gets one repair call on the small model with just the
+    response, rather than a new extraction from the page.
+    """
+    try:
+        return job_schema.parse(output)
+    except ValueError as e:
+        if "{" not in (output or ""):
+            raise
+        error = e
+    print(f"Repairing job details: {error}")
+    prompt = prompts.build_prompt(
+        JOB_REPAIR_TEMPLATE,
+        router.budget_key("extraction_small"),
+        name="repair_job_info",
+        keep=("fields", "error"),
+        fields=", ".join(job_schema.FIELD_NAMES),
+        error=str(error)[:300],
+        output=output
+    )
+    return job_schema.parse(await complete_job_details("extraction_small", prompt))
+
+async def extract_job_info_from_text(text):
+    """
+    Extract standard job posting fields from the given text, validated
+    against the JobDetails schema. Short pages are tried on the smaller
+    extraction model first and escalated to the extraction model (GPT-4o
+    by default) when the result is unusable or incomplete.
+    """
+    tasks = ["extraction"]
+    if prompts.count_tokens(text) <= EASY_PAGE_MAX_TOKENS:
+        tasks.insert(0, "extraction_small")
+    last_error = None
+    for task in tasks:
+        prompt = prompts.build_prompt(JOB_EXTRACTION_TEMPLATE, router.budget_key(task), name="extract_job_info",
+                                      text=text)
+        try:
+            details = await parse_job_details(await complete_job_details(task, prompt))
+        except (llm_client.LLMError, ValueError) as e:
+            print(f"Job extraction with {task} failed: {e}")
+            last_error = e
+            continue
+        if details.is_complete() or task == tasks[-1]:
+            return details.to_dict()
+        print(f"Job extraction with {task} is incomplete, escalating")
+        last_error = ValueError("Incomplete job details")
+    return {"error": "Extraction failed", "details": str(last_error)}
 
-# If you have any sharing or linking functionality, update it like:
-if st.button("Share this app"):
-    st.markdown(f"Share this app: {APP_URL}")
+if __name__ == "__main__":
+    import uvicorn
+    # More than one worker needs the import string so each process loads the app
+    workers = int(os.getenv("WORKERS", "1"))
+    uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT", "8000")), workers=workers)
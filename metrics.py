@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# ------------------------------
+# Metrics and request traces
+# ------------------------------
+# Counters and histograms are kept in process and exposed in the Prometheus
+# text format by the /metrics endpoint. Each HTTP request also gets a trace
+# that collects the time spent in each stage (scrape, parse, storage, LLM
+# calls...); traces are logged as one JSON line and, when DEBUG_TRACES
+# allows it, stored in full with the LLM responses for later inspection.
+
+# "off", "header" (only requests sent with an X-Debug-Trace: 1 header) or "all"
+DEBUG_TRACES = os.getenv("DEBUG_TRACES", "off").lower()
+TRACE_HEADER = b"x-debug-trace"
+LOG_REQUEST_TIMINGS = os.getenv("LOG_REQUEST_TIMINGS", "true").lower() == "true"
+
+# USD per million (prompt, completion) tokens
+LLM_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "o1-mini": (1.10, 4.40),
+}
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry = []
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            counts[index] += 1
+            counts[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, counts in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    labels = _format_labels(self.labels + ("le",), key + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {counts[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+http_requests = Counter("jobseeker_http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+http_seconds = Histogram("jobseeker_http_request_seconds", "HTTP request duration, including streamed bodies.",
+                         ("method", "route"))
+stage_seconds = Histogram("jobseeker_stage_seconds", "Time spent in each processing stage.", ("stage", "status"))
+llm_requests = Counter("jobseeker_llm_requests_total", "LLM calls.", ("backend", "model", "status"))
+llm_seconds = Histogram("jobseeker_llm_request_seconds", "LLM call duration, including retries.",
+                        ("backend", "model", "streaming"))
+llm_first_token_seconds = Histogram("jobseeker_llm_first_token_seconds", "Time to the first streamed LLM event.",
+                                    ("backend", "model"))
+llm_tokens = Counter("jobseeker_llm_tokens_total", "LLM tokens used.", ("backend", "model", "kind"))
+llm_cost = Counter("jobseeker_llm_cost_usd_total", "Estimated LLM cost in US dollars.", ("backend", "model"))
+llm_retries = Counter("jobseeker_llm_retries_total", "LLM calls retried after a transient error.", ("backend",))
+llm_routes = Counter("jobseeker_llm_routes_total", "LLM calls per task and backend.", ("task", "backend", "fallback"))
+scrape_fetches = Counter("jobseeker_scrape_fetches_total", "Job page fetches by result.", ("result",))
+scrape_bytes = Counter("jobseeker_scrape_bytes_total", "Decompressed bytes of job pages downloaded.")
+
+
+# ------------------------------
+# Per-request traces
+# ------------------------------
+class Trace:
+    def __init__(self, name: str, debug: bool = False):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.debug = debug
+        self.started = time.time()
+        self.spans = []
+        self.events = []
+
+    def stage_totals(self) -> dict:
+        totals = {}
+        for span in self.spans:
+            totals[span["stage"]] = round(totals.get(span["stage"], 0) + span["seconds"], 4)
+        return totals
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started": self.started,
+            "stages": self.stage_totals(),
+            "spans": self.spans,
+            "events": self.events,
+        }
+
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def _add_span(stage: str, start: float, seconds: float, **data):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append({"stage": stage, "offset": round(start - trace.started, 4),
+                            "seconds": round(seconds, 4), **data})
+
+
+@contextmanager
+def stage(name: str, **data):
+    """
+    Time a block of work as stage `name`, in the stage histogram and in
+    the current request's trace. Works in both sync and async code.
+    """
+    start = time.time()
+    began = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - began
+        stage_seconds.observe(seconds, stage=name, status=status)
+        _add_span(name, start, seconds, status=status, **data)
+
+
+def trace_event(name: str, data):
+    """
+    Attach a payload (e.g. a raw LLM response) to the current trace. Only
+    kept for debug traces, which are the only ones stored in full.
+    """
+    trace = _current_trace.get()
+    if trace is not None and trace.debug:
+        trace.events.append({"name": name, "offset": round(time.time() - trace.started, 4), "data": data})
+
+
+def llm_price(model: str):
+    # Dated snapshots ("gpt-4o-mini-2024-07-18") are priced like their base model
+    for name in sorted(LLM_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            return LLM_PRICES[name]
+    return None
+
+
+def record_llm_call(backend: str, model: str, seconds: float, usage: dict = None, error: str = None,
+                    streaming: bool = False, first_token: float = None, start: float = None):
+    """
+    Record one LLM call: duration, status, token usage and estimated cost.
+    """
+    model = model or "default"
+    llm_requests.inc(backend=backend, model=model, status="error" if error else "ok")
+    llm_seconds.observe(seconds, backend=backend, model=model, streaming=str(streaming).lower())
+    if first_token is not None:
+        llm_first_token_seconds.observe(first_token, backend=backend, model=model)
+    usage = usage or {}
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, backend=backend, model=model, kind="prompt")
+    if completion_tokens:
+        llm_tokens.inc(completion_tokens, backend=backend, model=model, kind="completion")
+    price = llm_price(model) if backend == "openai" else None
+    if price:
+        llm_cost.inc((prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000, backend=backend, model=model)
+    span = {"backend": backend, "model": model, "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens, "status": "error" if error else "ok"}
+    if first_token is not None:
+        span["first_token_seconds"] = round(first_token, 4)
+    if error:
+        span["error"] = error[:200]
+    _add_span(f"llm.{backend}", start or time.time() - seconds, seconds, **span)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request metrics and the per-request trace.
+    The trace is finished once the response body has been sent, so that
+    streamed responses are timed in full. `on_debug_trace(trace)` is called
+    for traces opted into DEBUG_TRACES.
+    """
+    def __init__(self, app, on_debug_trace=None):
+        self.app = app
+        self.on_debug_trace = on_debug_trace
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        debug = DEBUG_TRACES == "all" or (DEBUG_TRACES == "header" and headers.get(TRACE_HEADER) in (b"1", b"true"))
+        trace = Trace(f"{scope['method']} {scope['path']}", debug=debug)
+        token = _current_trace.set(trace)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if debug:
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace.trace_id.encode())]
+            await send(message)
+
+        began = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            seconds = time.perf_counter() - began
+            # Label by route template rather than path, so ids do not explode cardinality
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_requests.inc(method=scope["method"], route=route, status=str(status["code"]))
+            http_seconds.observe(seconds, method=scope["method"], route=route)
+            if LOG_REQUEST_TIMINGS and trace.spans:
+                print(json.dumps({"request": trace.name, "status": status["code"], "seconds": round(seconds, 4),
+                                  "stages": trace.stage_totals(), "trace_id": trace.trace_id if debug else None}))
+            if debug and self.on_debug_trace is not None:
+                try:
+                    await self.on_debug_trace(trace)
+                except Exception as e:
+                    print(f"Error saving trace {trace.trace_id}: {e}")
@@ -0,0 +1,133 @@
+import os
+import re
+import json
+
+# ------------------------------
+# Prompt budgeting
+# ------------------------------
+# Prompts are built from a template plus named sections (job details,
+# parsed profiles, page text...). Sections are trimmed so that the whole
+# prompt fits the token budget of the model it is sent to.
+
+# Prompt token budgets per model; override with PROMPT_BUDGET_<MODEL>,
+# e.g. PROMPT_BUDGET_O1_MINI=20000 or PROMPT_BUDGET_LOCAL=4000
+DEFAULT_BUDGETS = {
+    "o1-mini": 16000,
+    "gpt-4o": 16000,
+    "gpt-4o-mini": 16000,
+    "local": 6000,
+}
+DEFAULT_BUDGET = int(os.getenv("PROMPT_BUDGET_DEFAULT", "8000"))
+TRUNCATION_MARKER = "\n[...truncated]"
+
+_encodings = {}
+_tiktoken = None
+
+
+def _encoding(model: str):
+    # tiktoken is optional and slow to import, so load it on first use
+    global _tiktoken
+    if _tiktoken is None:
+        try:
+            import tiktoken
+            _tiktoken = tiktoken
+        except ImportError:
+            _tiktoken = False
+    if _tiktoken is False:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = _tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = _tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """
+    Count tokens with tiktoken when it is installed, otherwise estimate
+    about four characters per token.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """
+    Keep the beginning of `text` up to `max_tokens`, cut at a line break
+    when possible.
+    """
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    max_tokens = max(max_tokens - count_tokens(TRUNCATION_MARKER, model), 0)
+    encoding = _encoding(model)
+    if encoding is None:
+        head = text[:max_tokens * 4]
+    else:
+        head = encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    cut = head.rfind("\n")
+    if cut > len(head) * 0.8:
+        head = head[:cut]
+    return head + TRUNCATION_MARKER
+
+
+def budget_for(model: str) -> int:
+    env_name = "PROMPT_BUDGET_" + re.sub(r"[^A-Z0-9]", "_", model.upper())
+    return int(os.getenv(env_name, DEFAULT_BUDGETS.get(model, DEFAULT_BUDGET)))
+
+
+def compact_json(data) -> str:
+    """
+    Serialize structured data without whitespace or empty fields.
+    """
+    if isinstance(data, dict):
+        data = {key: value for key, value in data.items() if value not in ("", None, [], {})}
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def _allocate(sizes: dict, available: int) -> dict:
+    # Water-filling: small sections are kept whole and the largest ones
+    # share what is left equally
+    allocation = {}
+    remaining = max(available, 0)
+    ordered = sorted(sizes.items(), key=lambda item: item[1])
+    for index, (name, size) in enumerate(ordered):
+        share = remaining // (len(ordered) - index)
+        allocation[name] = min(size, share)
+        remaining -= allocation[name]
+    return allocation
+
+
+def build_prompt(template: str, model: str, name: str = "prompt", keep: tuple = (), budget: int = None,
+                 **sections) -> str:
+    """
+    Format `template` with `sections`, trimming them to fit the model budget.
+
+    Sections listed in `keep` are never trimmed; the others share whatever
+    budget is left after the template and the kept sections. Dicts and
+    lists are serialized as compact JSON.
+    """
+    budget = budget or budget_for(model)
+    texts = {}
+    for key, value in sections.items():
+        if value is None:
+            value = ""
+        texts[key] = value if isinstance(value, str) else compact_json(value)
+
+    fixed = count_tokens(template.format(**{key: "" for key in texts}), model)
+    fixed += sum(count_tokens(texts[key], model) for key in keep)
+    sizes = {key: count_tokens(text, model) for key, text in texts.items() if key not in keep}
+    allocation = _allocate(sizes, budget - fixed)
+    trimmed = [key for key, size in sizes.items() if allocation[key] < size]
+    for key in trimmed:
+        texts[key] = truncate_tokens(texts[key], allocation[key], model)
+
+    prompt = template.format(**texts)
+    tokens = count_tokens(prompt, model)
+    print(
+        f"Prompt {name} for {model}: {tokens} tokens (budget {budget})"
+        + (f", trimmed {', '.join(trimmed)}" if trimmed else "")
+    )
+    return prompt
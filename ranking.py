@@ -0,0 +1,179 @@
+import os
+import re
+import math
+import threading
+from collections import Counter, OrderedDict
+from cache import hash_text
+
+# ------------------------------
+# Experience relevance ranking
+# ------------------------------
+# The parsed resume, LinkedIn profile and experience details are split into
+# chunks and scored with TF-IDF against the job requirements, so that only
+# the most relevant experience goes into the resume prompt.
+RANKING_ENABLED = os.getenv("RANKING_ENABLED", "true").lower() == "true"
+RANKING_TOP_K = int(os.getenv("RANKING_TOP_K", "8"))
+# Number of user profiles whose index is kept in memory
+RANKING_INDEX_CACHE_SIZE = int(os.getenv("RANKING_INDEX_CACHE_SIZE", "256"))
+CHUNK_MAX_CHARS = 600
+
+# Profile fields indexed, in the order they are shown to the model
+SOURCES = {
+    "parsed_resume": "Resume",
+    "parsed_linkedin": "LinkedIn profile",
+    "parsed_experience": "Experience details",
+}
+# Job detail fields the chunks are scored against
+QUERY_FIELDS = ("requirements", "key responsibilities", "role", "description of the role")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in into is it its of on or our the their this to was were
+will with you your we who what which while within across over under such etc able ability strong
+experience experienced years year work working team teams role skills including using use new
+""".split())
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.\-]*[a-z0-9+#]|[a-z0-9]")
+
+
+def tokenize(text: str) -> list:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def split_chunks(text: str) -> list:
+    """
+    Split profile text into experience-sized chunks: paragraphs separated
+    by blank lines, with long paragraphs cut at line breaks.
+    """
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", text or ""):
+        lines = [line.rstrip() for line in paragraph.strip().splitlines() if line.strip()]
+        current = []
+        size = 0
+        for line in lines:
+            if current and size + len(line) > CHUNK_MAX_CHARS:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            chunks.append("\n".join(current))
+    return chunks
+
+
+class ExperienceIndex:
+    """
+    TF-IDF matrix of a user's profile chunks, one L2-normalized row per
+    chunk, so that scoring a job is a single matrix-vector product.
+    """
+    def __init__(self, user_data: dict):
+        import numpy as np
+        self.chunks = []
+        for field in SOURCES:
+            for position, text in enumerate(split_chunks(user_data.get(field) or "")):
+                self.chunks.append({"source": field, "position": position, "text": text})
+
+        counts = [Counter(tokenize(chunk["text"])) for chunk in self.chunks]
+        self.vocabulary = {}
+        for chunk_counts in counts:
+            for term in chunk_counts:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+
+        tf = np.zeros((len(self.chunks), len(self.vocabulary)), dtype=np.float32)
+        for row, chunk_counts in enumerate(counts):
+            for term, count in chunk_counts.items():
+                tf[row, self.vocabulary[term]] = count
+        document_frequency = np.count_nonzero(tf, axis=0)
+        # Smoothed IDF, as in scikit-learn
+        self.idf = (np.log((1 + len(self.chunks)) / (1 + document_frequency)) + 1).astype(np.float32)
+        # Sublinear TF so that a term repeated in one chunk does not dominate
+        weights = np.where(tf > 0, 1 + np.log(np.maximum(tf, 1)), 0) * self.idf
+        norms = np.linalg.norm(weights, axis=1, keepdims=True)
+        self.matrix = weights / np.where(norms == 0, 1, norms)
+
+    def score(self, query: str):
+        """
+        Cosine similarity of every chunk with `query`, or None when the
+        query shares no term with the profile.
+        """
+        import numpy as np
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for term, count in Counter(tokenize(query)).items():
+            column = self.vocabulary.get(term)
+            if column is not None:
+                vector[column] = 1 + math.log(count)
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return self.matrix @ (vector / norm)
+
+    def top_chunks(self, query: str, k: int = RANKING_TOP_K) -> list:
+        """
+        The `k` chunks most relevant to `query`, plus the first chunk of the
+        resume (name, contact, summary), in their original order. Returns
+        None when ranking would not remove anything.
+        """
+        import numpy as np
+        if len(self.chunks) <= k:
+            return None
+        scores = self.score(query)
+        if scores is None:
+            return None
+        selected = {i for i in np.argsort(-scores, kind="stable")[:k].tolist() if scores[i] > 0}
+        selected.update(i for i, chunk in enumerate(self.chunks)
+                        if chunk["source"] == "parsed_resume" and chunk["position"] == 0)
+        return [self.chunks[i] for i in sorted(selected)]
+
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_index(user_data: dict) -> ExperienceIndex:
+    """
+    Index of a user's profile, built once and reused until the parsed
+    documents change.
+    """
+    key = hash_text("\x00".join(user_data.get(field) or "" for field in SOURCES))
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = ExperienceIndex(user_data)
+    with _lock:
+        _indexes[key] = index
+        while len(_indexes) > RANKING_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def job_query(job_details: dict) -> str:
+    parts = []
+    for field in QUERY_FIELDS:
+        value = job_details.get(field)
+        if isinstance(value, list):
+            parts.extend(str(item) for item in value)
+        elif value:
+            parts.append(str(value))
+    return "\n".join(parts)
+
+
+def relevant_experience(user_data: dict, job_details: dict, k: int = RANKING_TOP_K) -> str:
+    """
+    Profile text to put in a prompt: the top-k chunks for the job when
+    ranking is enabled and useful, otherwise every profile document.
+    """
+    chunks = None
+    if RANKING_ENABLED:
+        query = job_query(job_details or {})
+        if query:
+            chunks = get_index(user_data).top_chunks(query, k)
+    sections = []
+    for field, label in SOURCES.items():
+        if chunks is None:
+            text = user_data.get(field) or ""
+        else:
+            text = "\n\n".join(chunk["text"] for chunk in chunks if chunk["source"] == field)
+        if text:
+            sections.append(f"{label}:\n{text}")
+    return "\n\n".join(sections)
@@ -0,0 +1,189 @@
+import os
+import time
+import llm_client
+import metrics
+import prompts
+from llm_client import LLMError
+
+# ------------------------------
+# Model routing
+# ------------------------------
+# Each task runs on a configured model, written "openai:<model>" or "local"
+# (the model loaded in LMStudio) / "local:<model>". MODEL_<TASK> sets the
+# primary model and FALLBACK_<TASK> the one used when it fails or when
+# every LMStudio server is busy or slow, e.g.
+#   MODEL_COVER_LETTER=local  FALLBACK_COVER_LETTER=openai:gpt-4o-mini
+USE_OPENAI = os.getenv("USE_OPENAI", "false").lower() == "true"
+GENERATION_DEFAULT = "openai:o1-mini" if USE_OPENAI else "local"
+
+DEFAULT_ROUTES = {
+    "extraction": ("openai:gpt-4o", None),
+    # Short, simple job pages and repairs of malformed extractions
+    "extraction_small": ("openai:gpt-4o-mini", None),
+    "summarization": ("openai:gpt-4o-mini", None),
+    "cover_letter": (GENERATION_DEFAULT, None),
+    "resume": (GENERATION_DEFAULT, None),
+}
+# Prefer the fallback once the best LMStudio server averages more than this per call
+LLM_FALLBACK_LATENCY = float(os.getenv("LLM_FALLBACK_LATENCY", "120"))
+# A slow server gets a new chance after this long without calls
+LLM_SLOW_RESET_SECONDS = float(os.getenv("LLM_SLOW_RESET_SECONDS", "60"))
+# LMStudio reasoning models may think at length before answering
+LOCAL_MAX_TOKENS = int(os.getenv("LOCAL_MAX_TOKENS", "50000"))
+
+
+class Route:
+    def __init__(self, spec: str):
+        backend, _, model = spec.strip().partition(":")
+        if backend not in ("local", "openai"):
+            raise ValueError(f"Unknown model backend in {spec!r}; use openai:<model> or local[:<model>]")
+        if backend == "openai" and not model:
+            raise ValueError(f"Missing OpenAI model name in {spec!r}")
+        self.backend = backend
+        self.model = model or None
+
+    @property
+    def budget_key(self) -> str:
+        # Key used for prompt token budgets (see prompts.DEFAULT_BUDGETS)
+        return "local" if self.backend == "local" else self.model
+
+    def __repr__(self):
+        return f"{self.backend}:{self.model}" if self.model else self.backend
+
+
+def load_routes() -> dict:
+    routes = {}
+    for task, (primary, fallback) in DEFAULT_ROUTES.items():
+        primary = os.getenv(f"MODEL_{task.upper()}", primary)
+        fallback = os.getenv(f"FALLBACK_{task.upper()}", fallback or "")
+        routes[task] = [Route(primary)] + ([Route(fallback)] if fallback else [])
+    return routes
+
+
+def _messages(route: Route, prompt: str, system: str = None) -> list:
+    messages = [{"role": "user", "content": prompt}]
+    if system:
+        # o1 models do not accept system messages
+        if route.model and route.model.startswith("o1"):
+            messages[0]["content"] = f"{system}\n\n{prompt}"
+        else:
+            messages.insert(0, {"role": "system", "content": system})
+    return messages
+
+
+class Router:
+    """
+    Sends each task's prompt to its configured model. Local calls go to
+    the least loaded LMStudio server; when all of them are saturated or
+    slower than LLM_FALLBACK_LATENCY, or the call fails, the task's
+    fallback model is used instead.
+    """
+    def __init__(self, routes: dict = None, local_clients: list = None, openai_client=None):
+        self.routes = routes if routes is not None else load_routes()
+        self.local_clients = local_clients if local_clients is not None else llm_client.local_clients
+        self.openai_client = openai_client or llm_client.openai_client
+
+    def budget_key(self, task: str) -> str:
+        """
+        Model whose prompt budget applies to `task`: the smallest among
+        the models the task may run on, so the prompt fits either way.
+        """
+        return min((route.budget_key for route in self.routes[task]), key=prompts.budget_for)
+
+    def _local_client(self):
+        # Least loaded first, then fastest
+        return min(self.local_clients, key=lambda client: (client.load, client.latency or 0))
+
+    def _slow(self, client) -> bool:
+        if client.latency is None or client.latency <= LLM_FALLBACK_LATENCY:
+            return False
+        return time.monotonic() - client.last_finished < LLM_SLOW_RESET_SECONDS
+
+    def plan(self, task: str) -> list:
+        """
+        Ordered `(route, client)` attempts for `task`.
+        """
+        attempts = []
+        for route in self.routes[task]:
+            client = self._local_client() if route.backend == "local" else self.openai_client
+            attempts.append((route, client))
+        if len(attempts) > 1:
+            route, client = attempts[0]
+            if route.backend == "local" and (client.saturated or self._slow(client)):
+                # Every LMStudio server is busy or slow: go straight to the fallback
+                attempts = attempts[1:] + attempts[:1]
+        return attempts
+
+    async def _call(self, route: Route, client, prompt: str, system: str = None, **params) -> str:
+        if route.model and route.model.startswith("o1"):
+            # o1 models do not support structured outputs
+            params.pop("response_format", None)
+        if route.backend == "openai":
+            data = await llm_client.openai_chat(_messages(route, prompt, system), model=route.model, client=client,
+                                                **params)
+            metrics.trace_event("openai_response", data)
+            return data["choices"][0]["message"]["content"]
+        if route.model:
+            params["model"] = route.model
+        if system:
+            data = await llm_client.local_chat(_messages(route, prompt, system), client=client, **params)
+            metrics.trace_event("local_response", data)
+            return data["choices"][0]["message"]["content"]
+        data = await llm_client.local_completion(prompt, client=client, max_tokens=LOCAL_MAX_TOKENS, **params)
+        metrics.trace_event("reasoning_response", data)
+        return data.get("choices", [{}])[0].get("text", "")
+
+    def _stream(self, route: Route, client, prompt: str, system: str = None):
+        if route.backend == "openai":
+            return llm_client.stream_openai_chat(_messages(route, prompt, system), model=route.model, client=client)
+        params = {"model": route.model} if route.model else {}
+        if system:
+            return llm_client.stream_local_chat(_messages(route, prompt, system), client=client, **params)
+        return llm_client.stream_local_completion(prompt, client=client, max_tokens=LOCAL_MAX_TOKENS, **params)
+
+    async def complete(self, task: str, prompt: str, system: str = None, **params) -> str:
+        """
+        Run `prompt` for `task`, falling back to the next model on failure.
+        Extra `params` (e.g. response_format) are passed to the API.
+        """
+        attempts = self.plan(task)
+        for index, (route, client) in enumerate(attempts):
+            metrics.llm_routes.inc(task=task, backend=client.name,
+                                   fallback=str(route is not self.routes[task][0]).lower())
+            try:
+                return await self._call(route, client, prompt, system, **dict(params))
+            except LLMError as e:
+                if index == len(attempts) - 1:
+                    raise
+                print(f"{task} on {route} failed, falling back to {attempts[index + 1][0]}: {e}")
+
+    async def stream(self, task: str, prompt: str, system: str = None):
+        """
+        Stream the reply to `prompt` for `task`. The fallback model is only
+        tried if the failure happens before any text was produced.
+        """
+        attempts = self.plan(task)
+        for index, (route, client) in enumerate(attempts):
+            metrics.llm_routes.inc(task=task, backend=client.name,
+                                   fallback=str(route is not self.routes[task][0]).lower())
+            started = False
+            try:
+                async for text in self._stream(route, client, prompt, system):
+                    started = True
+                    yield text
+                return
+            except LLMError as e:
+                if started or index == len(attempts) - 1:
+                    raise
+                print(f"{task} on {route} failed, falling back to {attempts[index + 1][0]}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "routes": {task: [repr(route) for route in routes] for task, routes in self.routes.items()},
+            "backends": {
+                client.name: client.stats() for client in self.local_clients + [self.openai_client]
+            },
+        }
+
+
+router = Router()
@@ -0,0 +1,222 @@
+import os
+import re
+import json
+import html
+import httpx
+from dotenv import load_dotenv
+import cache
+import metrics
+
+load_dotenv()
+
+# ------------------------------
+# Job page fetching
+# ------------------------------
+# One pooled async client for all job sites, with timeouts, a cap on the
+# downloaded size and conditional requests: pages served with an ETag or
+# Last-Modified header are kept on disk and revalidated, so an unchanged
+# posting costs a 304 instead of a full download.
+SCRAPE_CONNECT_TIMEOUT = float(os.getenv("SCRAPE_CONNECT_TIMEOUT", "5"))
+SCRAPE_READ_TIMEOUT = float(os.getenv("SCRAPE_READ_TIMEOUT", "15"))
+SCRAPE_MAX_BYTES = int(os.getenv("SCRAPE_MAX_BYTES", str(5 * 1024 * 1024)))
+SCRAPE_MAX_CONNECTIONS = int(os.getenv("SCRAPE_MAX_CONNECTIONS", "20"))
+SCRAPE_USER_AGENT = os.getenv(
+    "SCRAPE_USER_AGENT",
+    "Mozilla/5.0 (compatible; JobSeekerBuddy/1.0; +https://github.com/francisbrero/JobSeeker-Buddy)",
+)
+
+# Job boards with a public JSON API, fetched instead of the rendered page
+GREENHOUSE_PATTERN = re.compile(r"^https?://(?:boards|job-boards)\.greenhouse\.io/([^/?#]+)/jobs/(\d+)")
+LEVER_PATTERN = re.compile(r"^https?://jobs\.lever\.co/([^/?#]+)/([0-9a-fA-F-]{36})")
+
+_client = None
+
+
+class ScrapeError(Exception):
+    """
+    A job page could not be fetched. `status_code` is the HTTP status to
+    answer the API caller with.
+    """
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _accept_encoding() -> str:
+    # httpx only decodes Brotli when a Brotli package is installed
+    try:
+        import brotli  # noqa: F401
+        return "gzip, deflate, br"
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+            return "gzip, deflate, br"
+        except ImportError:
+            return "gzip, deflate"
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            follow_redirects=True,
+            max_redirects=5,
+            timeout=httpx.Timeout(SCRAPE_READ_TIMEOUT, connect=SCRAPE_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=SCRAPE_MAX_CONNECTIONS,
+                max_keepalive_connections=SCRAPE_MAX_CONNECTIONS,
+            ),
+            headers={
+                "User-Agent": SCRAPE_USER_AGENT,
+                "Accept-Encoding": _accept_encoding(),
+                "Accept-Language": "en-US,en;q=0.8",
+            },
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch(url: str, accept: str = "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8") -> dict:
+    """
+    GET `url` and return `{"url", "text", "not_modified"}`, revalidating a
+    previously stored copy when the server supports it. Raises ScrapeError
+    on HTTP errors, timeouts and bodies larger than SCRAPE_MAX_BYTES.
+    """
+    key = cache.hash_text(cache.normalize_url(url))
+    cached = cache.scraped_pages.get(key)
+    headers = {"Accept": accept}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    try:
+        async with get_client().stream("GET", url, headers=headers) as response:
+            if response.status_code == 304 and cached:
+                metrics.scrape_fetches.inc(result="not_modified")
+                # Re-store to restart the TTL of a page that is still current
+                cache.scraped_pages.set(key, cached)
+                return {"url": cached["url"], "text": cached["text"], "not_modified": True}
+            if response.status_code >= 400:
+                raise ScrapeError(f"{url} returned HTTP {response.status_code}")
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > SCRAPE_MAX_BYTES:
+                raise ScrapeError(f"{url} is larger than {SCRAPE_MAX_BYTES} bytes")
+            chunks = []
+            size = 0
+            # Counted after decompression, so a small gzip body cannot expand unchecked
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > SCRAPE_MAX_BYTES:
+                    raise ScrapeError(f"{url} is larger than {SCRAPE_MAX_BYTES} bytes")
+                chunks.append(chunk)
+            text = b"".join(chunks).decode(response.encoding or "utf-8", errors="replace")
+            entry = {
+                "url": str(response.url),
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "text": text,
+            }
+    except ScrapeError:
+        metrics.scrape_fetches.inc(result="error")
+        raise
+    except httpx.TimeoutException as e:
+        metrics.scrape_fetches.inc(result="error")
+        raise ScrapeError(f"Timed out fetching {url}: {e!r}", status_code=504)
+    except httpx.HTTPError as e:
+        metrics.scrape_fetches.inc(result="error")
+        raise ScrapeError(f"Error fetching {url}: {e!r}")
+    metrics.scrape_fetches.inc(result="downloaded")
+    metrics.scrape_bytes.inc(size)
+    if entry["etag"] or entry["last_modified"]:
+        cache.scraped_pages.set(key, entry)
+    return {"url": entry["url"], "text": text, "not_modified": False}
+
+
+# ------------------------------
+# Applicant tracking system APIs
+# ------------------------------
+# Postings are mapped to the schema.org JobPosting shape so they go through
+# the same conversion as JSON-LD found in job pages.
+def _greenhouse_posting(data: dict, board: str) -> dict:
+    location = (data.get("location") or {}).get("name", "")
+    return {
+        "title": data.get("title", ""),
+        # The API returns the description HTML entity-encoded
+        "description": html.unescape(data.get("content") or ""),
+        "hiringOrganization": {"name": data.get("company_name") or board},
+        "jobLocation": {"address": location} if location else [],
+    }
+
+
+def _lever_posting(data: dict, company: str) -> dict:
+    sections = [data.get("description") or ""]
+    for item in data.get("lists") or []:
+        sections.append(f"<h3>{item.get('text', '')}</h3><ul>{item.get('content', '')}</ul>")
+    sections.append(data.get("additional") or "")
+    categories = data.get("categories") or {}
+    posting = {
+        "title": data.get("text", ""),
+        "description": "".join(sections),
+        "hiringOrganization": {"name": company.replace("-", " ").title()},
+        "jobLocation": {"address": categories["location"]} if categories.get("location") else [],
+    }
+    if data.get("workplaceType") == "remote":
+        posting["jobLocationType"] = "TELECOMMUTE"
+    salary = data.get("salaryRange")
+    if salary:
+        posting["baseSalary"] = {
+            "currency": salary.get("currency", ""),
+            "value": {
+                "minValue": salary.get("min"),
+                "maxValue": salary.get("max"),
+                "unitText": (salary.get("interval") or "").replace("per-", "").replace("-salary", ""),
+            },
+        }
+    return posting
+
+
+async def fetch_ats_posting(url: str):
+    """
+    Fetch a Greenhouse or Lever posting from the board's JSON API, which
+    needs no JavaScript rendering. Returns a JobPosting-shaped dict, or
+    None when the URL is not a supported board or the API call fails.
+    """
+    match = GREENHOUSE_PATTERN.match(url)
+    if match:
+        board, job_id = match.groups()
+        api_url = f"https://boards-api.greenhouse.io/v1/boards/{board}/jobs/{job_id}"
+        build = lambda data: _greenhouse_posting(data, board)
+    else:
+        match = LEVER_PATTERN.match(url)
+        if not match:
+            return None
+        company, posting_id = match.groups()
+        api_url = f"https://api.lever.co/v0/postings/{company}/{posting_id}"
+        build = lambda data: _lever_posting(data, company)
+    try:
+        response = await fetch(api_url, accept="application/json")
+        return build(json.loads(response["text"]))
+    except (ScrapeError, ValueError, AttributeError) as e:
+        print(f"Job board API failed for {url}, falling back to the page: {e}")
+        return None
+
+
+async def fetch_job_page(url: str, use_api: bool = True) -> dict:
+    """
+    Fetch a job posting. Returns `{"text", "posting", "not_modified",
+    "source"}` where `posting` is the JobPosting from a job board API (the
+    page `text` is then empty) or None when the page itself was fetched.
+    `use_api=False` always fetches the page.
+    """
+    posting = await fetch_ats_posting(url) if use_api else None
+    if posting is not None:
+        return {"text": "", "posting": posting, "not_modified": False, "source": "ats_api"}
+    page = await fetch(url)
+    return {"text": page["text"], "posting": None, "not_modified": page["not_modified"], "source": "page"}
@@ -11,7 +11,12 @@ pip install -r requirements.txt
 
 # Start the FastAPI backend
 echo "Starting FastAPI backend..."
-uvicorn main:app --host 0.0.0.0 --port 8000 &
+# WORKERS > 1 runs several uvicorn workers under gunicorn (see gunicorn.conf.py)
+if [ "${WORKERS:-1}" -gt 1 ]; then
+    gunicorn main:app -c gunicorn.conf.py &
+else
+    uvicorn main:app --host 0.0.0.0 --port 8000 &
+fi
 
 # Start the Streamlit app (assumes you have streamlit_app.py)
 echo "Starting Streamlit app..."
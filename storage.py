@@ -0,0 +1,516 @@
+import os
+import json
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from cache import MemoryCache
+import metrics
+
+load_dotenv()
+
+# ------------------------------
+# Storage backends for users, applications, jobs and batches
+# ------------------------------
+# "firestore" (default) or "sqlite" for local development, tests and benchmarks
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore").lower()
+FIREBASE_CREDENTIALS_PATH = os.getenv("FIREBASE_CREDENTIALS_PATH", "./firebase_credentials.json")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "jobseeker.db")
+
+# Firestore accepts at most 500 writes per batch
+FIRESTORE_BATCH_LIMIT = 500
+
+# Read-through cache for user and application documents. It is per process
+# and only sees this process's writes, so it is off by default when several
+# workers serve requests: another worker could read a profile or latest
+# document version that was already replaced.
+MULTIPLE_WORKERS = max(int(os.getenv("WEB_CONCURRENCY") or 1), int(os.getenv("WORKERS") or 1)) > 1
+DOCUMENT_CACHE_ENABLED = os.getenv(
+    "DOCUMENT_CACHE_ENABLED", "false" if MULTIPLE_WORKERS else "true"
+).lower() == "true"
+DOCUMENT_CACHE_TTL_SECONDS = float(os.getenv("DOCUMENT_CACHE_TTL_SECONDS", "300"))
+DOCUMENT_CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def legacy_versions(application: dict):
+    """
+    Version records (oldest first) and `latest` pointers for the `versions`
+    array of an application created before versions had their own
+    collection. Each entry of the array listed the path of every document;
+    only the documents whose path changed are kept as part of a version.
+    """
+    records, latest, paths = [], {}, {}
+    for number, version in enumerate(application.get("versions") or [], start=1):
+        documents = {
+            name: {"path": path} for name, path in version.items()
+            if name != "feedback" and path and paths.get(name) != path
+        }
+        records.append({"number": number, "feedback": version.get("feedback"), "created": None,
+                        "documents": documents})
+        for name, entry in documents.items():
+            paths[name] = entry["path"]
+            latest[name] = {"version": number, "depth": 0}
+    return records, latest
+
+
+class Repository:
+    """
+    Access to the `users`, `applications`, `jobs` and `batches` collections,
+    and to
+    the document versions of each application. Documents are plain dicts;
+    missing documents are returned as None.
+    """
+    def get_user(self, user_id: str):
+        raise NotImplementedError
+
+    def set_user(self, user_id: str, data: dict):
+        """
+        Merge `data` into the user document, creating it if needed.
+        """
+        raise NotImplementedError
+
+    def get_application(self, application_id: str):
+        raise NotImplementedError
+
+    def get_user_and_application(self, user_id: str, application_id: str):
+        """
+        Fetch a user and an application in a single round trip when the
+        backend allows it. Returns a `(user, application)` tuple.
+        """
+        return self.get_user(user_id), self.get_application(application_id)
+
+    def create_applications(self, items: list):
+        """
+        Create several `(application_id, document)` pairs in one write.
+        """
+        raise NotImplementedError
+
+    def create_application(self, application_id: str, data: dict):
+        self.create_applications([(application_id, data)])
+
+    def add_version(self, application_id: str, version: dict, latest: dict) -> int:
+        """
+        Store `version` as the application's next version and return its
+        number. `latest` maps each document it changes to the pointer kept
+        in the application document's `latest` field; the version number is
+        set on the record and on each pointer. A legacy `versions` array is
+        first moved to the versions collection, so numbering continues
+        after it.
+        """
+        raise NotImplementedError
+
+    def get_version(self, application_id: str, number: int):
+        raise NotImplementedError
+
+    def list_versions(self, application_id: str, limit: int, before: int = None) -> list:
+        """
+        Up to `limit` versions of an application, newest first, numbered
+        below `before` when given.
+        """
+        raise NotImplementedError
+
+    def save_job(self, job: dict):
+        raise NotImplementedError
+
+    def get_job(self, job_id: str):
+        raise NotImplementedError
+
+    def save_batch(self, batch: dict):
+        raise NotImplementedError
+
+    def get_batch(self, batch_id: str):
+        raise NotImplementedError
+
+
+class FirestoreRepository(Repository):
+    """
+    Firestore-backed repository. The Firebase Admin SDK is initialized on
+    first use, from the FIREBASE_CREDENTIALS environment variable (the
+    service account JSON itself) or from FIREBASE_CREDENTIALS_PATH.
+    """
+    def __init__(self, credentials_path: str = FIREBASE_CREDENTIALS_PATH):
+        self.credentials_path = credentials_path
+        self._db = None
+        self._lock = threading.Lock()
+
+    @property
+    def db(self):
+        with self._lock:
+            if self._db is None:
+                import firebase_admin
+                from firebase_admin import credentials, firestore
+                raw_credentials = os.getenv("FIREBASE_CREDENTIALS")
+                if raw_credentials:
+                    cred = credentials.Certificate(json.loads(raw_credentials))
+                else:
+                    cred = credentials.Certificate(self.credentials_path)
+                if not firebase_admin._apps:
+                    firebase_admin.initialize_app(cred)
+                self._db = firestore.client()
+        return self._db
+
+    def _doc(self, collection: str, document_id: str):
+        return self.db.collection(collection).document(document_id)
+
+    def get_user(self, user_id: str):
+        return self._doc("users", user_id).get().to_dict()
+
+    def set_user(self, user_id: str, data: dict):
+        self._doc("users", user_id).set(data, merge=True)
+
+    def get_application(self, application_id: str):
+        return self._doc("applications", application_id).get().to_dict()
+
+    def get_user_and_application(self, user_id: str, application_id: str):
+        user_ref = self._doc("users", user_id)
+        app_ref = self._doc("applications", application_id)
+        # get_all does not preserve order, so match snapshots by path
+        snapshots = {snapshot.reference.path: snapshot for snapshot in self.db.get_all([user_ref, app_ref])}
+        user = snapshots.get(user_ref.path)
+        application = snapshots.get(app_ref.path)
+        return (
+            user.to_dict() if user is not None and user.exists else None,
+            application.to_dict() if application is not None and application.exists else None,
+        )
+
+    def create_applications(self, items: list):
+        for start in range(0, len(items), FIRESTORE_BATCH_LIMIT):
+            write_batch = self.db.batch()
+            for application_id, data in items[start:start + FIRESTORE_BATCH_LIMIT]:
+                write_batch.set(self._doc("applications", application_id), data)
+            write_batch.commit()
+
+    def _versions(self, application_id: str):
+        # Subcollection, so the application document stays small
+        return self._doc("applications", application_id).collection("versions")
+
+    def add_version(self, application_id: str, version: dict, latest: dict) -> int:
+        from firebase_admin import firestore
+        app_ref = self._doc("applications", application_id)
+
+        @firestore.transactional
+        def add(transaction):
+            snapshot = app_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                raise KeyError(f"Application {application_id} not found")
+            current = snapshot.to_dict()
+            if "version_count" in current:
+                records, legacy_latest = [], None
+                number = current["version_count"] + 1
+            else:
+                records, legacy_latest = legacy_versions(current)
+                number = len(records) + 1
+            # Zero-padded ids sort like the version numbers
+            for record in records + [{**version, "number": number}]:
+                transaction.set(self._versions(application_id).document(f"{record['number']:08d}"), record)
+            pointers = {name: {**pointer, "version": number} for name, pointer in latest.items()}
+            if legacy_latest is None:
+                update = {f"latest.{name}": pointer for name, pointer in pointers.items()}
+            else:
+                update = {"latest": {**legacy_latest, **pointers}, "versions": firestore.DELETE_FIELD}
+            update["version_count"] = number
+            transaction.update(app_ref, update)
+            return number
+
+        return add(self.db.transaction())
+
+    def get_version(self, application_id: str, number: int):
+        return self._versions(application_id).document(f"{number:08d}").get().to_dict()
+
+    def list_versions(self, application_id: str, limit: int, before: int = None) -> list:
+        from firebase_admin import firestore
+        query = self._versions(application_id).order_by("number", direction=firestore.Query.DESCENDING)
+        if before is not None:
+            query = query.start_after({"number": before})
+        return [snapshot.to_dict() for snapshot in query.limit(limit).stream()]
+
+    def save_job(self, job: dict):
+        self._doc("jobs", job["job_id"]).set(job)
+
+    def get_job(self, job_id: str):
+        return self._doc("jobs", job_id).get().to_dict()
+
+    def save_batch(self, batch: dict):
+        self._doc("batches", batch["batch_id"]).set(batch)
+
+    def get_batch(self, batch_id: str):
+        return self._doc("batches", batch_id).get().to_dict()
+
+
+class SQLiteRepository(Repository):
+    """
+    Local stand-in for Firestore: each collection is a table of JSON
+    documents keyed by id. Runs offline with no credentials.
+    """
+    COLLECTIONS = ("users", "applications", "jobs", "batches")
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        # Several worker processes may share the file: wait on locks rather than fail
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            for collection in self.COLLECTIONS:
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {collection} (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS versions (application_id TEXT NOT NULL, number INTEGER NOT NULL, "
+                "data TEXT NOT NULL, PRIMARY KEY (application_id, number))"
+            )
+
+    def _get(self, collection: str, document_id: str):
+        row = self._conn.execute(f"SELECT data FROM {collection} WHERE id = ?", (document_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, collection: str, document_id: str, data: dict):
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO {collection} (id, data) VALUES (?, ?)",
+            (document_id, json.dumps(data)),
+        )
+
+    def _update(self, collection: str, document_id: str, update):
+        # Read-modify-write inside one transaction
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                data = self._get(collection, document_id)
+                self._put(collection, document_id, update(data))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get_user(self, user_id: str):
+        with self._lock:
+            return self._get("users", user_id)
+
+    def set_user(self, user_id: str, data: dict):
+        self._update("users", user_id, lambda current: {**(current or {}), **data})
+
+    def get_application(self, application_id: str):
+        with self._lock:
+            return self._get("applications", application_id)
+
+    def create_applications(self, items: list):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for application_id, data in items:
+                    self._put("applications", application_id, data)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def add_version(self, application_id: str, version: dict, latest: dict) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = self._get("applications", application_id)
+                if current is None:
+                    raise KeyError(f"Application {application_id} not found")
+                if "version_count" not in current:
+                    records, current["latest"] = legacy_versions(current)
+                    current.pop("versions", None)
+                    current["version_count"] = len(records)
+                    for record in records:
+                        self._insert_version(application_id, record)
+                number = current["version_count"] + 1
+                self._insert_version(application_id, {**version, "number": number})
+                current["version_count"] = number
+                current["latest"] = {
+                    **current.get("latest", {}),
+                    **{name: {**pointer, "version": number} for name, pointer in latest.items()},
+                }
+                self._put("applications", application_id, current)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return number
+
+    def _insert_version(self, application_id: str, record: dict):
+        self._conn.execute(
+            "INSERT INTO versions (application_id, number, data) VALUES (?, ?, ?)",
+            (application_id, record["number"], json.dumps(record)),
+        )
+
+    def get_version(self, application_id: str, number: int):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM versions WHERE application_id = ? AND number = ?", (application_id, number)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_versions(self, application_id: str, limit: int, before: int = None) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM versions WHERE application_id = ? AND number < ? ORDER BY number DESC LIMIT ?",
+                (application_id, before if before is not None else 2 ** 62, limit),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def save_job(self, job: dict):
+        with self._lock:
+            self._put("jobs", job["job_id"], job)
+
+    def get_job(self, job_id: str):
+        with self._lock:
+            return self._get("jobs", job_id)
+
+    def save_batch(self, batch: dict):
+        with self._lock:
+            self._put("batches", batch["batch_id"], batch)
+
+    def get_batch(self, batch_id: str):
+        with self._lock:
+            return self._get("batches", batch_id)
+
+
+class TimedRepository(Repository):
+    """
+    Records the time of each call to another repository as a
+    `storage.<method>` stage in the metrics and request trace.
+    """
+    def __init__(self, inner: Repository):
+        self.inner = inner
+
+    def _timed(self, method: str, *args):
+        with metrics.stage(f"storage.{method}"):
+            return getattr(self.inner, method)(*args)
+
+    def get_user(self, user_id: str):
+        return self._timed("get_user", user_id)
+
+    def set_user(self, user_id: str, data: dict):
+        self._timed("set_user", user_id, data)
+
+    def get_application(self, application_id: str):
+        return self._timed("get_application", application_id)
+
+    def get_user_and_application(self, user_id: str, application_id: str):
+        return self._timed("get_user_and_application", user_id, application_id)
+
+    def create_applications(self, items: list):
+        self._timed("create_applications", items)
+
+    def add_version(self, application_id: str, version: dict, latest: dict) -> int:
+        return self._timed("add_version", application_id, version, latest)
+
+    def get_version(self, application_id: str, number: int):
+        return self._timed("get_version", application_id, number)
+
+    def list_versions(self, application_id: str, limit: int, before: int = None) -> list:
+        return self._timed("list_versions", application_id, limit, before)
+
+    def save_job(self, job: dict):
+        self._timed("save_job", job)
+
+    def get_job(self, job_id: str):
+        return self._timed("get_job", job_id)
+
+    def save_batch(self, batch: dict):
+        self._timed("save_batch", batch)
+
+    def get_batch(self, batch_id: str):
+        return self._timed("get_batch", batch_id)
+
+
+class CachedRepository(Repository):
+    """
+    Read-through cache in front of another repository for the user and
+    application documents read on every generation. Entries are dropped
+    whenever this process writes them, and expire after a TTL to pick up
+    writes from elsewhere. Only safe when a single process serves all
+    requests (see DOCUMENT_CACHE_ENABLED).
+    """
+    def __init__(self, inner: Repository, ttl: float = DOCUMENT_CACHE_TTL_SECONDS,
+                 max_bytes: int = DOCUMENT_CACHE_MAX_BYTES):
+        self.inner = inner
+        self.cache = MemoryCache("documents", ttl, max_bytes)
+
+    def _get(self, key: str, load):
+        data = self.cache.get(key)
+        if data is None:
+            data = load()
+            if data is not None:
+                self.cache.set(key, data)
+        return data
+
+    def get_user(self, user_id: str):
+        return self._get(f"users/{user_id}", lambda: self.inner.get_user(user_id))
+
+    def set_user(self, user_id: str, data: dict):
+        self.inner.set_user(user_id, data)
+        self.cache.invalidate(f"users/{user_id}")
+
+    def get_application(self, application_id: str):
+        return self._get(f"applications/{application_id}", lambda: self.inner.get_application(application_id))
+
+    def get_user_and_application(self, user_id: str, application_id: str):
+        user = self.cache.get(f"users/{user_id}")
+        application = self.cache.get(f"applications/{application_id}")
+        if user is None and application is None:
+            user, application = self.inner.get_user_and_application(user_id, application_id)
+            if user is not None:
+                self.cache.set(f"users/{user_id}", user)
+            if application is not None:
+                self.cache.set(f"applications/{application_id}", application)
+        elif user is None:
+            user = self.get_user(user_id)
+        elif application is None:
+            application = self.get_application(application_id)
+        return user, application
+
+    def create_applications(self, items: list):
+        self.inner.create_applications(items)
+        for application_id, _ in items:
+            self.cache.invalidate(f"applications/{application_id}")
+
+    def add_version(self, application_id: str, version: dict, latest: dict) -> int:
+        number = self.inner.add_version(application_id, version, latest)
+        self.cache.invalidate(f"applications/{application_id}")
+        return number
+
+    def get_version(self, application_id: str, number: int):
+        return self.inner.get_version(application_id, number)
+
+    def list_versions(self, application_id: str, limit: int, before: int = None) -> list:
+        return self.inner.list_versions(application_id, limit, before)
+
+    def save_job(self, job: dict):
+        self.inner.save_job(job)
+
+    def get_job(self, job_id: str):
+        return self.inner.get_job(job_id)
+
+    def save_batch(self, batch: dict):
+        self.inner.save_batch(batch)
+
+    def get_batch(self, batch_id: str):
+        return self.inner.get_batch(batch_id)
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats()
+
+
+_repository = None
+
+
+def get_repository() -> Repository:
+    """
+    Repository selected by STORAGE_BACKEND, created once per process.
+    """
+    global _repository
+    if _repository is None:
+        if STORAGE_BACKEND == "sqlite":
+            _repository = SQLiteRepository()
+        elif STORAGE_BACKEND == "firestore":
+            _repository = FirestoreRepository()
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+        # Timed below the cache so that only actual round trips are measured
+        _repository = TimedRepository(_repository)
+        if DOCUMENT_CACHE_ENABLED:
+            _repository = CachedRepository(_repository)
+    return _repository
@@ -0,0 +1,60 @@
+import json
+import pytest
+import job_schema
+
+DETAILS = {
+    "company": "Acme",
+    "role": "Data Engineer",
+    "location": "Remote",
+    "salary": "",
+    "description of the role": "Build the analytics platform",
+    "key responsibilities": ["Design pipelines", "Run Airflow"],
+    "requirements": ["Python", "SQL"],
+}
+RAW = json.dumps(DETAILS, indent=2)
+
+
+@pytest.mark.parametrize("response", [
+    RAW,
+    f"```json\n{RAW}\n```",
+    f"```\n{RAW}\n```",
+    f"Here are the job details:\n{RAW}\nLet me know if you need anything else.",
+    RAW.replace('"SQL"', '"SQL",').replace('"Run Airflow"\n', '"Run Airflow",\n'),
+    RAW[:-2] + ",\n}",
+    RAW.replace('"Acme"', "“Acme”"),
+    repr(DETAILS),
+])
+def test_parse_repairs_near_misses(response):
+    assert job_schema.parse(response).to_dict() == DETAILS
+
+
+def test_parse_closes_truncated_output():
+    truncated = RAW[:RAW.index('"SQL"') + 3]
+    details = job_schema.parse(truncated)
+    assert details.role == "Data Engineer"
+    assert details.requirements == ["Python", "SQ"]
+
+
+def test_parse_closes_output_truncated_after_a_comma():
+    truncated = RAW[:RAW.index('"requirements"')]
+    details = job_schema.parse(truncated)
+    assert details.responsibilities == ["Design pipelines", "Run Airflow"]
+    assert details.requirements == []
+
+
+def test_parse_coerces_loose_types():
+    details = job_schema.parse(json.dumps({**DETAILS, "requirements": "Python", "salary": None}))
+    assert details.requirements == ["Python"]
+    assert details.salary == ""
+
+
+@pytest.mark.parametrize("response", ["", "No job posting found on this page.", "[1, 2, 3]", "{not json at all"])
+def test_parse_rejects_unrecoverable_responses(response):
+    with pytest.raises(ValueError):
+        job_schema.parse(response)
+
+
+def test_is_complete():
+    assert job_schema.parse(RAW).is_complete()
+    assert not job_schema.JobDetails.model_validate({"role": "Data Engineer"}).is_complete()
+    assert not job_schema.JobDetails.model_validate({**DETAILS, "role": ""}).is_complete()
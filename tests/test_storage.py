@@ -0,0 +1,55 @@
+import pytest
+from storage import SQLiteRepository
+
+
+@pytest.fixture
+def repo():
+    return SQLiteRepository(":memory:")
+
+
+def legacy_application():
+    # Shape of an application written before versions had their own table
+    return {
+        "user_id": "u1",
+        "job_link": "https://example.com/jobs/1",
+        "versions": [
+            {"cover_letter": "apps/a1/cover_letter_v1.txt", "resume": "apps/a1/resume_v1.txt", "feedback": None},
+            {"cover_letter": "apps/a1/cover_letter_v2.txt", "resume": "apps/a1/resume_v1.txt",
+             "feedback": "shorter cover letter"},
+        ],
+    }
+
+
+def test_add_version_migrates_legacy_versions(repo):
+    repo.create_application("a1", legacy_application())
+
+    number = repo.add_version("a1", {"feedback": "more formal", "created": 1.0, "documents": {
+        "resume": {"base": 1, "delta": "..."},
+    }}, {"resume": {"depth": 1}})
+
+    assert number == 3
+    application = repo.get_application("a1")
+    assert "versions" not in application
+    assert application["version_count"] == 3
+    # The new pointer is merged with the ones migrated from the array
+    assert application["latest"] == {
+        "cover_letter": {"version": 2, "depth": 0},
+        "resume": {"version": 3, "depth": 1},
+    }
+    records = repo.list_versions("a1", limit=10)
+    assert [record["number"] for record in records] == [3, 2, 1]
+    assert records[1]["documents"] == {"cover_letter": {"path": "apps/a1/cover_letter_v2.txt"}}
+    assert records[1]["feedback"] == "shorter cover letter"
+    assert records[2]["documents"] == {
+        "cover_letter": {"path": "apps/a1/cover_letter_v1.txt"},
+        "resume": {"path": "apps/a1/resume_v1.txt"},
+    }
+
+
+def test_add_version_migrates_only_once(repo):
+    repo.create_application("a1", legacy_application())
+    repo.add_version("a1", {"feedback": None, "created": 1.0, "documents": {}}, {})
+
+    assert repo.add_version("a1", {"feedback": None, "created": 2.0, "documents": {}}, {}) == 4
+    assert [record["number"] for record in repo.list_versions("a1", limit=10)] == [4, 3, 2, 1]
+    assert repo.get_version("a1", 1)["documents"]["resume"] == {"path": "apps/a1/resume_v1.txt"}
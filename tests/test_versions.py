@@ -0,0 +1,69 @@
+import pytest
+import versions
+
+LETTER = "".join(f"Paragraph {i} about pipelines in Python and SQL.\n" for i in range(40))
+
+
+@pytest.mark.parametrize("base, text", [
+    (LETTER, LETTER.replace("Paragraph 3", "Revised paragraph 3")),
+    (LETTER, "New opening line.\n" + LETTER + "Kind regards"),
+    (LETTER, LETTER.rstrip("\n")),
+    ("no trailing newline", "no trailing newline\nadded"),
+    ("first\nsecond", "second"),
+    ("", "from nothing"),
+    ("to nothing", ""),
+    (LETTER, LETTER.replace("\n", "\r\n")),
+])
+def test_delta_round_trip(base, text):
+    assert versions.apply_delta(base, versions.make_delta(base, text)) == text
+
+
+def test_encode_prefers_delta_for_small_revisions():
+    text = LETTER.replace("Paragraph 5", "Paragraph five")
+    delta = versions.encode(text, LETTER, {"version": 1, "depth": 0})
+    assert delta is not None
+    assert len(delta) < len(text) // 2
+    assert versions.apply_delta(LETTER, delta) == text
+
+
+def test_encode_stores_whole_text_without_a_previous_version():
+    assert versions.encode(LETTER) is None
+    assert versions.encode(LETTER, LETTER, None) is None
+
+
+def test_encode_stores_whole_text_when_rewritten():
+    rewritten = "".join(f"Completely different sentence {i}.\n" for i in range(40))
+    assert versions.encode(rewritten, LETTER, {"version": 1, "depth": 0}) is None
+
+
+def test_encode_snapshots_at_the_interval(monkeypatch):
+    monkeypatch.setattr(versions, "VERSION_SNAPSHOT_INTERVAL", 3)
+    text = LETTER.replace("Paragraph 5", "Paragraph five")
+    assert versions.encode(text, LETTER, {"version": 1, "depth": 1}) is not None
+    assert versions.encode(text, LETTER, {"version": 2, "depth": 2}) is None
+
+
+def test_document_text_follows_the_delta_chain():
+    texts = [LETTER]
+    for i in range(3):
+        texts.append(texts[-1].replace(f"Paragraph {i} ", f"Revised paragraph {i} "))
+    files = {"letter_1.txt": texts[0]}
+    records = {1: {"number": 1, "documents": {"cover_letter": {"path": "letter_1.txt"}}}}
+    for number in (2, 3, 4):
+        delta = versions.make_delta(texts[number - 2], texts[number - 1])
+        records[number] = {"number": number, "documents": {"cover_letter": {"base": number - 1, "delta": delta}}}
+    # Version 5 only changed the resume
+    records[5] = {"number": 5, "documents": {"resume": {"path": "resume_5.txt"}}}
+
+    loaded = {number: records[number] for number in (3, 4)}
+    fetched = []
+
+    def get_record(number):
+        fetched.append(number)
+        return records[number]
+
+    for number, expected in zip((1, 2, 3, 4), texts):
+        assert versions.document_text(loaded, get_record, files.__getitem__, number, "cover_letter") == expected
+    # Records missing from the loaded page are fetched once, then reused
+    assert sorted(fetched) == [1, 2]
+    assert versions.document_text(loaded, get_record, files.__getitem__, 5, "cover_letter") is None
@@ -0,0 +1,86 @@
+import os
+import json
+import zlib
+import base64
+import difflib
+
+# ------------------------------
+# Delta-compressed document versions
+# ------------------------------
+# Each feedback round only changes part of a cover letter or resume, so a
+# new version is stored as a line delta against the version it revised.
+# Every VERSION_SNAPSHOT_INTERVAL versions of a document, or when the delta
+# would not be much smaller than the text, the full text is written to the
+# file store instead, which bounds how many deltas a read has to apply.
+VERSION_SNAPSHOT_INTERVAL = int(os.getenv("VERSION_SNAPSHOT_INTERVAL", "10"))
+
+
+def _pack(value) -> str:
+    packed = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+    return base64.b64encode(packed).decode("ascii")
+
+
+def make_delta(base: str, text: str) -> str:
+    """
+    Encode `text` as a delta against `base`: a list of operations, either
+    `[start, end]` to copy lines of `base` or a string to insert, stored as
+    compressed JSON in a base64 string (Firestore does not accept nested
+    arrays).
+    """
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif tag in ("replace", "insert"):
+            ops.append("".join(lines[j1:j2]))
+    return _pack(ops)
+
+
+def apply_delta(base: str, delta: str) -> str:
+    base_lines = base.splitlines(keepends=True)
+    ops = json.loads(zlib.decompress(base64.b64decode(delta)))
+    return "".join(op if isinstance(op, str) else "".join(base_lines[op[0]:op[1]]) for op in ops)
+
+
+def encode(text: str, base_text: str = None, base_pointer: dict = None):
+    """
+    Delta of `text` against the previous version, or None when the text
+    should be stored whole: no previous version, the delta chain reached
+    VERSION_SNAPSHOT_INTERVAL or the delta is not under half the size of
+    the text compressed the same way (a rewrite would otherwise pass as a
+    delta holding a compressed copy of the whole text).
+    """
+    if base_text is None or not base_pointer:
+        return None
+    if base_pointer.get("depth", 0) + 1 >= VERSION_SNAPSHOT_INTERVAL:
+        return None
+    delta = make_delta(base_text, text)
+    return delta if len(delta) < len(_pack([text])) // 2 else None
+
+
+def document_text(records: dict, get_record, read_text, number: int, name: str):
+    """
+    Rebuild document `name` as of version `number` by following the deltas
+    back to the last full snapshot. `records` maps already loaded version
+    numbers to their records; `get_record(number)` loads any other one and
+    `read_text(key)` reads a snapshot from the file store. Blocking.
+    """
+    chain = []
+    while True:
+        record = records.get(number)
+        if record is None:
+            record = records[number] = get_record(number)
+        entry = (record or {}).get("documents", {}).get(name)
+        if entry is None:
+            return None
+        if "delta" not in entry:
+            break
+        chain.append(entry["delta"])
+        number = entry["base"]
+    text = read_text(entry["path"])
+    for delta in reversed(chain):
+        text = apply_delta(text, delta)
+    return text